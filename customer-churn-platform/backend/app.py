@@ -1,15 +1,18 @@
 """Flask API for customer churn prediction platform."""
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, current_app
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import logging
+import orjson
 import os
 import traceback
+from typing import Callable
 
-from models.churn_predictor import ChurnPredictor, LifetimeValuePredictor
+from models.churn_predictor import ChurnPredictor, LifetimeValuePredictor, FeaturePipeline, split_rows
+from models.batching import MicroBatcher
 from data_pipeline.etl import ChurnETLPipeline
 from config.database import init_db, get_connection
 
@@ -21,6 +24,22 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+def _json_default(obj):
+    """Serialize pandas scalars that orjson does not handle natively."""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    raise TypeError
+
+def json_response(obj, status: int = 200):
+    """Build a JSON response, serializing numpy values natively."""
+    return app.response_class(
+        orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype='application/json'
+    )
+
 # Global model instances
 churn_model = None
 clv_model = None
@@ -29,27 +48,77 @@ def load_models():
     """Load trained models."""
     global churn_model, clv_model
     
+    # Long-lived ETL pipeline so extract caching spans requests
+    app.extensions['etl'] = ChurnETLPipeline()
+    etl_pipeline = app.extensions['etl']
+    
     try:
         # Initialize models
         churn_model = ChurnPredictor(model_type='random_forest')
         clv_model = LifetimeValuePredictor()
         
-        # Try to load existing models
-        if os.path.exists('models/churn_model.joblib'):
-            churn_model.load_model('models/churn_model.joblib')
-            logger.info("Loaded existing churn model")
+        # Collate concurrent prediction requests into one predict call
+        app.extensions['churn_batcher'] = MicroBatcher(churn_model.predict_matrix)
+        app.extensions['clv_batcher'] = MicroBatcher(clv_model.predict_matrix)
         
-        if os.path.exists('models/clv_model.joblib'):
-            clv_model.load_model('models/clv_model.joblib')
-            logger.info("Loaded existing CLV model")
+        # Try to load existing models
+        _load_artifact('models/churn_model.joblib', churn_model.load_model, 'churn model')
+        if churn_model.is_trained:
+            _load_artifact('models/churn_model.onnx', churn_model.load_onnx, 'ONNX churn model')
+        _load_artifact('models/clv_model.joblib', clv_model.load_model, 'CLV model')
+        _load_artifact('models/feature_encoder.joblib', etl_pipeline.load_encoder, 'feature encoder')
             
     except Exception as e:
         logger.error(f"Error loading models: {str(e)}")
 
+def _load_artifact(filepath: str, load: Callable[[str], None], name: str) -> None:
+    """Load one saved artifact if present; a failure is logged and the others still load."""
+    if not os.path.exists(filepath):
+        return
+    try:
+        load(filepath)
+        logger.info(f"Loaded existing {name}")
+    except Exception as e:
+        logger.error(f"Error loading {name} from {filepath}: {str(e)}")
+
+def _customer_ids(features_df: pd.DataFrame) -> np.ndarray:
+    """Customer IDs for a prediction batch, falling back to row position."""
+    if 'customer_id' in features_df.columns:
+        return features_df['customer_id'].to_numpy(dtype=np.int64)
+    return np.arange(len(features_df))
+
+# Response labels by number of ascending thresholds exceeded
+RISK_THRESHOLDS = (0.3, 0.7)
+RISK_LEVELS = np.array(['Low', 'Medium', 'High'])
+CLV_THRESHOLDS = (500, 1000)
+CLV_SEGMENTS = np.array(['Low Value', 'Medium Value', 'High Value'])
+
+def _bucket(values: np.ndarray, thresholds: tuple, labels: np.ndarray) -> np.ndarray:
+    """Label each value by how many of the ascending thresholds it exceeds."""
+    index = np.zeros(len(values), dtype=np.int8)
+    exceeded = np.empty(len(values), dtype=np.int8)
+    for threshold in thresholds:
+        # Comparison written straight into the int8 buffer, no bool temporary
+        np.greater(values, threshold, out=exceeded, casting='unsafe')
+        index += exceeded
+    return labels[index]
+
+def _save_churn_model() -> None:
+    """Persist the churn model along with its fastest inference artifact."""
+    os.makedirs('models', exist_ok=True)
+    churn_model.save_model('models/churn_model.joblib', export_native=True)
+    
+    # Export to ONNX where no native library was compiled
+    if (churn_model.native_predictor is None and not churn_model.categories
+            and churn_model.model_type in ChurnPredictor.ONNX_MODEL_TYPES):
+        churn_model.export_onnx('models/churn_model.onnx')
+    elif os.path.exists('models/churn_model.onnx'):
+        os.remove('models/churn_model.onnx')
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
-    return jsonify({
+    return json_response({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'models_loaded': {
@@ -62,30 +131,37 @@ def health_check():
 def train_models():
     """Train ML models with current data."""
     try:
+        etl_pipeline = current_app.extensions['etl']
         # Run ETL pipeline to get fresh features
-        etl_pipeline = ChurnETLPipeline()
-        features_df = etl_pipeline.run_etl_pipeline()
+        watermark = etl_pipeline.database_time()
+        features_df = etl_pipeline.run_etl_pipeline(fit_encoder=True)
         
         results = {}
         
+        # Impute and scale once for both models, fitted on the training
+        # rows of the split both models use
+        train_rows, _ = split_rows(features_df)
+        pipeline = FeaturePipeline().fit(features_df.iloc[train_rows])
+        
         # Train churn model
         if churn_model:
-            churn_results = churn_model.train(features_df)
+            churn_results = churn_model.train(features_df, pipeline=pipeline)
+            churn_model.data_watermark = watermark
             results['churn_model'] = churn_results
             
             # Save model
-            os.makedirs('models', exist_ok=True)
-            churn_model.save_model('models/churn_model.joblib')
+            _save_churn_model()
+            etl_pipeline.save_encoder('models/feature_encoder.joblib')
         
         # Train CLV model (if we have the data)
         if clv_model and 'total_charges' in features_df.columns:
-            clv_results = clv_model.train(features_df)
+            clv_results = clv_model.train(features_df, pipeline=pipeline)
             results['clv_model'] = clv_results
             
             # Save model
             clv_model.save_model('models/clv_model.joblib')
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': 'Models trained successfully',
             'results': results,
@@ -94,21 +170,59 @@ def train_models():
         
     except Exception as e:
         logger.error(f"Training error: {str(e)}")
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e),
             'traceback': traceback.format_exc()
-        }), 500
+        }, 500)
+
+@app.route('/api/train/incremental', methods=['POST'])
+def update_models():
+    """Update the churn model with customers changed since the last ETL run."""
+    try:
+        etl_pipeline = current_app.extensions['etl']
+        if not churn_model or not churn_model.is_trained:
+            return json_response({'error': 'Churn model not trained'}, 400)
+        
+        # Changes are taken since the model last saw data, not since the
+        # feature store's last load; scheduled ETL runs advance that one
+        watermark = etl_pipeline.database_time()
+        features_df = etl_pipeline.run_etl_pipeline(incremental=True, since=churn_model.data_watermark)
+        
+        results = {}
+        if len(features_df) > 0:
+            results['churn_model'] = churn_model.partial_train(features_df)
+            # Skipped updates keep the watermark so their rows are retried
+            if results['churn_model']['updated']:
+                churn_model.data_watermark = watermark
+                _save_churn_model()
+        
+        return json_response({
+            'status': 'success',
+            'message': 'Models updated successfully',
+            'records_processed': len(features_df),
+            'results': results,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Incremental training error: {str(e)}")
+        return json_response({
+            'status': 'error',
+            'message': str(e),
+            'traceback': traceback.format_exc()
+        }, 500)
 
 @app.route('/api/predict/churn', methods=['POST'])
 def predict_churn():
     """Predict churn probability for customers."""
     try:
+        etl_pipeline = current_app.extensions['etl']
         if not churn_model or not churn_model.is_trained:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Churn model not trained. Please train the model first.'
-            }), 400
+            }, 400)
         
         data = request.get_json()
         
@@ -117,7 +231,6 @@ def predict_churn():
             customer_ids = data['customer_ids']
             
             # Get customer features from database
-            etl_pipeline = ChurnETLPipeline()
             customer_df = etl_pipeline.extract_customer_data()
             usage_df = etl_pipeline.extract_usage_data(customer_ids)
             features_df = etl_pipeline.transform_features(customer_df, usage_df)
@@ -130,24 +243,25 @@ def predict_churn():
             features_df = pd.DataFrame(data['features'])
             
         else:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Either customer_ids or features must be provided'
-            }), 400
+            }, 400)
         
         # Make predictions
-        predictions = churn_model.predict(features_df)
+        batcher = current_app.extensions['churn_batcher']
+        predictions = batcher.submit(churn_model.feature_matrix(features_df))
         
         # Prepare response
-        results = []
-        for i, (_, row) in enumerate(features_df.iterrows()):
-            results.append({
-                'customer_id': int(row.get('customer_id', i)),
-                'churn_probability': float(predictions[i]),
-                'risk_level': 'High' if predictions[i] > 0.7 else 'Medium' if predictions[i] > 0.3 else 'Low'
-            })
-        
-        return jsonify({
+        probs = np.asarray(predictions, dtype=float)
+        risk = _bucket(probs, RISK_THRESHOLDS, RISK_LEVELS)
+        results = pd.DataFrame({
+            'customer_id': _customer_ids(features_df),
+            'churn_probability': probs,
+            'risk_level': risk
+        }).to_dict('records')
+        
+        return json_response({
             'status': 'success',
             'predictions': results,
             'timestamp': datetime.now().isoformat()
@@ -155,21 +269,22 @@ def predict_churn():
         
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e),
             'traceback': traceback.format_exc()
-        }), 500
+        }, 500)
 
 @app.route('/api/predict/clv', methods=['POST'])
 def predict_clv():
     """Predict customer lifetime value."""
     try:
+        etl_pipeline = current_app.extensions['etl']
         if not clv_model or not clv_model.is_trained:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'CLV model not trained. Please train the model first.'
-            }), 400
+            }, 400)
         
         data = request.get_json()
         
@@ -177,7 +292,6 @@ def predict_clv():
             customer_ids = data['customer_ids']
             
             # Get customer features
-            etl_pipeline = ChurnETLPipeline()
             customer_df = etl_pipeline.extract_customer_data()
             usage_df = etl_pipeline.extract_usage_data(customer_ids)
             features_df = etl_pipeline.transform_features(customer_df, usage_df)
@@ -188,24 +302,25 @@ def predict_clv():
             features_df = pd.DataFrame(data['features'])
             
         else:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': 'Either customer_ids or features must be provided'
-            }), 400
+            }, 400)
         
         # Make predictions
-        predictions = clv_model.predict(features_df)
+        batcher = current_app.extensions['clv_batcher']
+        predictions = batcher.submit(clv_model.feature_matrix(features_df))
         
         # Prepare response
-        results = []
-        for i, (_, row) in enumerate(features_df.iterrows()):
-            results.append({
-                'customer_id': int(row.get('customer_id', i)),
-                'predicted_clv': float(predictions[i]),
-                'clv_segment': 'High Value' if predictions[i] > 1000 else 'Medium Value' if predictions[i] > 500 else 'Low Value'
-            })
-        
-        return jsonify({
+        values = np.asarray(predictions, dtype=float)
+        segment = _bucket(values, CLV_THRESHOLDS, CLV_SEGMENTS)
+        results = pd.DataFrame({
+            'customer_id': _customer_ids(features_df),
+            'predicted_clv': values,
+            'clv_segment': segment
+        }).to_dict('records')
+        
+        return json_response({
             'status': 'success',
             'predictions': results,
             'timestamp': datetime.now().isoformat()
@@ -213,65 +328,69 @@ def predict_clv():
         
     except Exception as e:
         logger.error(f"CLV prediction error: {str(e)}")
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
-        }), 500
+        }, 500)
 
 @app.route('/api/customers', methods=['GET'])
 def get_customers():
     """Get customer list with basic info."""
     try:
-        etl_pipeline = ChurnETLPipeline()
+        etl_pipeline = current_app.extensions['etl']
         customer_df = etl_pipeline.extract_customer_data()
         
-        # Convert to list of dictionaries
-        customers = customer_df.to_dict('records')
-        
-        # Convert numpy types to Python types for JSON serialization
-        for customer in customers:
-            for key, value in customer.items():
-                if isinstance(value, (np.integer, np.floating)):
-                    customer[key] = value.item()
-                elif pd.isna(value):
-                    customer[key] = None
+        # Serialize the typed frame in one pass and embed it as-is
+        customers = orjson.Fragment(
+            customer_df.to_json(orient='records', date_format='iso', date_unit='s')
+        )
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'customers': customers,
-            'count': len(customers)
+            'count': len(customer_df)
         })
         
     except Exception as e:
         logger.error(f"Error fetching customers: {str(e)}")
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
-        }), 500
+        }, 500)
 
 @app.route('/api/analytics/dashboard', methods=['GET'])
 def get_dashboard_data():
     """Get dashboard analytics data."""
     try:
-        etl_pipeline = ChurnETLPipeline()
-        customer_df = etl_pipeline.extract_customer_data()
+        etl_pipeline = current_app.extensions['etl']
+        metrics_df = etl_pipeline.extract_dashboard_metrics()
+        
+        totals = metrics_df[metrics_df['is_total'] == 1].iloc[0]
+        by_subscription = (
+            metrics_df[(metrics_df['is_total'] == 0) & metrics_df['subscription_type'].notna()]
+            .set_index('subscription_type')
+            .sort_values('customer_count', ascending=False)
+        )
         
         # Calculate key metrics
-        total_customers = len(customer_df)
-        churned_customers = customer_df['churned'].sum()
+        total_customers = totals['customer_count']
+        churned_customers = totals['churned_count']
         churn_rate = churned_customers / total_customers if total_customers > 0 else 0
         
         # Revenue metrics
-        total_revenue = customer_df['total_charges'].sum()
-        avg_revenue_per_customer = customer_df['total_charges'].mean()
+        total_revenue = totals['total_revenue']
+        avg_revenue_per_customer = totals['avg_revenue']
         
         # Subscription type distribution
-        subscription_dist = customer_df['subscription_type'].value_counts().to_dict()
+        subscription_dist = by_subscription['customer_count'].to_dict()
         
         # Churn by subscription type
-        churn_by_subscription = customer_df.groupby('subscription_type')['churned'].agg(['count', 'sum']).to_dict()
+        churn_by_subscription = {
+            'count': by_subscription['customer_count'].to_dict(),
+            'sum': by_subscription['churned_count'].to_dict()
+        }
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'metrics': {
                 'total_customers': int(total_customers),
@@ -289,19 +408,19 @@ def get_dashboard_data():
         
     except Exception as e:
         logger.error(f"Dashboard error: {str(e)}")
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
-        }), 500
+        }, 500)
 
 @app.route('/api/etl/run', methods=['POST'])
 def run_etl():
     """Manually trigger ETL pipeline."""
     try:
-        etl_pipeline = ChurnETLPipeline()
-        features_df = etl_pipeline.run_etl_pipeline()
+        etl_pipeline = current_app.extensions['etl']
+        features_df = etl_pipeline.run_etl_pipeline(incremental=True)
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': 'ETL pipeline completed successfully',
             'records_processed': len(features_df),
@@ -310,10 +429,10 @@ def run_etl():
         
     except Exception as e:
         logger.error(f"ETL error: {str(e)}")
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
-        }), 500
+        }, 500)
 
 if __name__ == '__main__':
     # Initialize database
@@ -327,3 +446,11 @@ if __name__ == '__main__':
     debug = os.getenv('FLASK_DEBUG', 'false').lower() == 'true'
     
     app.run(host='0.0.0.0', port=port, debug=debug)
+else:
+    # Under gunicorn --preload this runs once in the master before forking
+    try:
+        init_db()
+    except Exception as e:
+        logger.error(f"Error initializing database: {str(e)}")
+    
+    load_models()
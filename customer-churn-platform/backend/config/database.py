@@ -1,7 +1,7 @@
 """Database configuration and connection management."""
 
 import os
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
@@ -37,9 +37,69 @@ def get_db():
     finally:
         db.close()
 
+# Idempotent schema changes for databases created by an older init.sql,
+# which only runs on a fresh volume
+SCHEMA_MIGRATIONS = [
+    # Dashboard aggregates (refreshed by the ETL pipeline)
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS dashboard_metrics AS
+    SELECT
+        c.subscription_type,
+        GROUPING(c.subscription_type) AS is_total,
+        COUNT(*) AS customer_count,
+        SUM(CASE WHEN ch.customer_id IS NOT NULL THEN 1 ELSE 0 END) AS churned_count,
+        SUM(c.total_charges) AS total_revenue,
+        AVG(c.total_charges) AS avg_revenue
+    FROM customers c
+    LEFT JOIN churn_events ch ON c.customer_id = ch.customer_id
+    GROUP BY GROUPING SETS ((), (c.subscription_type))
+    """,
+    # Keep customers.updated_at current so incremental ETL sees updates
+    """
+    CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.updated_at = CURRENT_TIMESTAMP;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS customers_set_updated_at ON customers",
+    """
+    CREATE TRIGGER customers_set_updated_at
+    BEFORE UPDATE ON customers
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at()
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_churn_events_created_at ON churn_events(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_usage_metrics_created_at ON usage_metrics(created_at)",
+    # Unique key backing the feature store upsert; older databases have a
+    # non-unique index under another name and may hold duplicate rows
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('uq_feature_store_customer_date') IS NULL THEN
+            DELETE FROM feature_store a USING feature_store b
+            WHERE a.customer_id = b.customer_id
+              AND a.feature_date = b.feature_date
+              AND a.feature_id < b.feature_id;
+            CREATE UNIQUE INDEX uq_feature_store_customer_date ON feature_store(customer_id, feature_date);
+        END IF;
+    END
+    $$
+    """,
+    "DROP INDEX IF EXISTS idx_feature_store_customer_date",
+]
+
+# Serializes migrations across processes starting at the same time
+MIGRATION_LOCK_ID = 7411
+
 def init_db():
-    """Initialize database tables."""
+    """Initialize database tables and apply schema migrations."""
     Base.metadata.create_all(bind=engine)
+    
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+        for statement in SCHEMA_MIGRATIONS:
+            conn.execute(text(statement))
 
 def get_connection():
     """Get raw database connection."""
@@ -3,23 +3,91 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from sqlalchemy import text
+from sqlalchemy import text, bindparam, Integer, String
 from typing import Dict, List, Optional
+from cachetools import TTLCache, cachedmethod
+from cachetools.keys import hashkey
+from sklearn.preprocessing import OneHotEncoder
+from numba import njit, prange
+import pyarrow as pa
+import pyarrow.compute as pc
+import connectorx as cx
+import joblib
+import io
 import logging
+import threading
 
-from config.database import get_connection, engine
+from config.database import get_connection, engine, DATABASE_URL
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Categorical columns expanded into indicator features
+CATEGORICAL_COLUMNS = ['gender', 'subscription_type', 'contract_length', 'payment_method']
+
+def _extract_key(name: str):
+    """Build a cache key for an extract method, ignoring ``self``."""
+    def key(self, *args, **kwargs):
+        args = tuple(tuple(a) if isinstance(a, list) else a for a in args)
+        kwargs = {k: tuple(v) if isinstance(v, list) else v for k, v in kwargs.items()}
+        return hashkey(name, *args, **kwargs)
+    return key
+
+def _read_sql(query, params: Optional[Dict] = None) -> pd.DataFrame:
+    """Read a query into pandas through connectorx's Arrow transport.
+    
+    connectorx has no bind-parameter support, so bound values are rendered
+    as escaped literals by SQLAlchemy's Postgres compiler first.
+    """
+    if params:
+        query = query.bindparams(**params)
+    sql = str(query.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+    return cx.read_sql(DATABASE_URL, sql, return_type='pandas', protocol='binary')
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _derive_usage_features(login_mean, session_mean, features_mean, tickets_sum, tenure_days):
+    """Compute the derived usage features in one fused pass.
+    
+    Returns ``(avg_session_per_login, support_ticket_rate, engagement_score)``
+    as float32 arrays rounded to 4 decimals.
+    """
+    n = login_mean.shape[0]
+    avg_session = np.empty(n, np.float32)
+    ticket_rate = np.empty(n, np.float32)
+    engagement = np.empty(n, np.float32)
+    
+    for i in prange(n):
+        logins = login_mean[i] if login_mean[i] != 0 else 1.0
+        tenure = tenure_days[i] if tenure_days[i] != 0 else 1.0
+        avg_session[i] = round(session_mean[i] / logins, 4)
+        ticket_rate[i] = round(tickets_sum[i] / tenure * 30, 4)
+        engagement[i] = round(
+            login_mean[i] * 0.3 + session_mean[i] / 60 * 0.4 + features_mean[i] * 0.3, 4
+        )
+    
+    return avg_session, ticket_rate, engagement
+
 class ChurnETLPipeline:
     """ETL pipeline for processing customer churn data."""
     
     def __init__(self):
         self.connection = None
+        self.encoder = None
+        
+        # Short-lived cache of extracted frames, shared across request threads
+        self._extract_cache = TTLCache(maxsize=8, ttl=60)
+        self._cache_lock = threading.Lock()
+    
+    def clear_cache(self) -> None:
+        """Drop all cached extracts so the next call hits the database."""
+        with self._cache_lock:
+            self._extract_cache.clear()
     
-    def extract_customer_data(self, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+    @cachedmethod(lambda self: self._extract_cache, key=_extract_key('customers'),
+                  lock=lambda self: self._cache_lock)
+    def extract_customer_data(self, start_date: str = None, end_date: str = None,
+                              customer_ids: List[int] = None) -> pd.DataFrame:
         """Extract customer data from database."""
         logger.info("Extracting customer data...")
         
@@ -44,157 +112,341 @@ class ChurnETLPipeline:
         LEFT JOIN churn_events ch ON c.customer_id = ch.customer_id
         """
         
+        conditions = []
+        bind_params = []
+        params = {}
         if start_date and end_date:
-            query += f" WHERE c.signup_date BETWEEN '{start_date}' AND '{end_date}'"
+            conditions.append("c.signup_date BETWEEN :start_date AND :end_date")
+            bind_params += [bindparam('start_date', type_=String), bindparam('end_date', type_=String)]
+            params.update({'start_date': start_date, 'end_date': end_date})
         
-        with engine.connect() as conn:
-            df = pd.read_sql(query, conn)
+        if customer_ids:
+            conditions.append("c.customer_id IN :customer_ids")
+            bind_params.append(bindparam('customer_ids', type_=Integer, expanding=True))
+            params['customer_ids'] = list(customer_ids)
+        
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        
+        stmt = text(query)
+        if bind_params:
+            stmt = stmt.bindparams(*bind_params)
+        
+        df = _read_sql(stmt, params)
         
         logger.info(f"Extracted {len(df)} customer records")
         return df
     
+    @cachedmethod(lambda self: self._extract_cache, key=_extract_key('usage'),
+                  lock=lambda self: self._cache_lock)
     def extract_usage_data(self, customer_ids: List[int] = None) -> pd.DataFrame:
-        """Extract usage metrics data."""
+        """Extract usage metrics aggregated per customer."""
         logger.info("Extracting usage data...")
         
         query = """
         SELECT 
             customer_id,
-            metric_date,
-            login_count,
-            session_duration_minutes,
-            features_used,
-            support_tickets,
-            data_usage_gb
+            ROUND(AVG(login_count), 4)::float8 AS login_count_mean,
+            SUM(login_count) AS login_count_sum,
+            ROUND(STDDEV(login_count), 4)::float8 AS login_count_std,
+            ROUND(AVG(session_duration_minutes), 4)::float8 AS session_duration_minutes_mean,
+            SUM(session_duration_minutes) AS session_duration_minutes_sum,
+            ROUND(STDDEV(session_duration_minutes), 4)::float8 AS session_duration_minutes_std,
+            ROUND(AVG(features_used), 4)::float8 AS features_used_mean,
+            MAX(features_used) AS features_used_max,
+            ROUND(STDDEV(features_used), 4)::float8 AS features_used_std,
+            SUM(support_tickets) AS support_tickets_sum,
+            ROUND(AVG(support_tickets), 4)::float8 AS support_tickets_mean,
+            ROUND(AVG(data_usage_gb), 4)::float8 AS data_usage_gb_mean,
+            ROUND(SUM(data_usage_gb), 4)::float8 AS data_usage_gb_sum,
+            ROUND(STDDEV(data_usage_gb), 4)::float8 AS data_usage_gb_std
         FROM usage_metrics
         """
         
+        params = {}
         if customer_ids:
-            customer_ids_str = ','.join(map(str, customer_ids))
-            query += f" WHERE customer_id IN ({customer_ids_str})"
+            query += " WHERE customer_id IN :customer_ids"
+            params = {'customer_ids': list(customer_ids)}
         
-        query += " ORDER BY customer_id, metric_date"
+        query += " GROUP BY customer_id ORDER BY customer_id"
         
+        stmt = text(query)
+        if params:
+            stmt = stmt.bindparams(bindparam('customer_ids', type_=Integer, expanding=True))
+        
+        df = _read_sql(stmt, params)
+        
+        logger.info(f"Extracted usage aggregates for {len(df)} customers")
+        return df
+    
+    def database_time(self) -> datetime:
+        """Current database time, comparable with the tables' row timestamps."""
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT LOCALTIMESTAMP")).scalar()
+    
+    def extract_changed_customer_ids(self, since: Optional[datetime] = None) -> Optional[List[int]]:
+        """Find customers whose data or churn label changed on or after ``since``.
+        
+        ``since`` defaults to the last feature load. Returns ``None`` when
+        there is no watermark, meaning every customer needs processing. The
+        comparison is inclusive of the last feature date, so activity later
+        that day is picked up next run.
+        """
         with engine.connect() as conn:
-            df = pd.read_sql(query, conn)
+            if since is None:
+                since = conn.execute(text(
+                    "SELECT MAX(feature_date) FROM feature_store"
+                )).scalar()
+            
+            if since is None:
+                return None
+            
+            rows = conn.execute(text("""
+                SELECT customer_id FROM usage_metrics WHERE created_at >= :since
+                UNION
+                SELECT customer_id FROM customers WHERE updated_at >= :since
+                UNION
+                SELECT customer_id FROM churn_events WHERE created_at >= :since
+            """), {"since": since}).fetchall()
+        
+        customer_ids = [row[0] for row in rows]
+        logger.info(f"Found {len(customer_ids)} customers changed since {since}")
+        return customer_ids
+    
+    @cachedmethod(lambda self: self._extract_cache, key=_extract_key('dashboard'),
+                  lock=lambda self: self._cache_lock)
+    def extract_dashboard_metrics(self) -> pd.DataFrame:
+        """Extract precomputed dashboard aggregates.
+        
+        Returns one grand-total row (``is_total = 1``) plus one row per
+        subscription type from the ``dashboard_metrics`` materialized view.
+        """
+        logger.info("Extracting dashboard metrics...")
         
-        logger.info(f"Extracted {len(df)} usage records")
+        df = _read_sql(text("SELECT * FROM dashboard_metrics"))
+        
+        numeric_cols = df.select_dtypes(include=[np.number]).columns
+        df[numeric_cols] = df[numeric_cols].fillna(0)
         return df
     
-    def transform_features(self, customer_df: pd.DataFrame, usage_df: pd.DataFrame) -> pd.DataFrame:
-        """Transform raw data into ML features."""
-        logger.info("Transforming features...")
+    def refresh_dashboard_metrics(self) -> None:
+        """Refresh the dashboard aggregates materialized view."""
+        logger.info("Refreshing dashboard metrics...")
         
-        # Calculate customer tenure
-        customer_df['signup_date'] = pd.to_datetime(customer_df['signup_date'])
-        customer_df['tenure_days'] = (datetime.now() - customer_df['signup_date']).dt.days
+        with engine.connect() as conn:
+            conn.execute(text("REFRESH MATERIALIZED VIEW dashboard_metrics"))
+            conn.commit()
         
-        # Aggregate usage metrics per customer
-        usage_agg = usage_df.groupby('customer_id').agg({
-            'login_count': ['mean', 'sum', 'std'],
-            'session_duration_minutes': ['mean', 'sum', 'std'],
-            'features_used': ['mean', 'max', 'std'],
-            'support_tickets': ['sum', 'mean'],
-            'data_usage_gb': ['mean', 'sum', 'std']
-        }).round(4)
+        # Drop aggregates cached by dashboard requests during the ETL run
+        self.clear_cache()
+    
+    def transform_features(self, customer_df: pd.DataFrame, usage_df: pd.DataFrame,
+                           fit_encoder: bool = False) -> pd.DataFrame:
+        """Transform raw data into ML features.
         
-        # Flatten column names
-        usage_agg.columns = ['_'.join(col).strip() for col in usage_agg.columns]
-        usage_agg = usage_agg.reset_index()
+        The categorical encoder is refit when ``fit_encoder`` is set or none
+        has been fitted yet; otherwise the existing encoder is reused so the
+        indicator columns match what the models were trained on.
+        """
+        logger.info("Transforming features...")
         
-        # Merge customer and usage data
-        features_df = customer_df.merge(usage_agg, on='customer_id', how='left')
+        # Extracts may be shared through the cache, so never mutate them
+        customer_df = customer_df.copy()
         
-        # Fill missing values
-        numeric_cols = features_df.select_dtypes(include=[np.number]).columns
-        features_df[numeric_cols] = features_df[numeric_cols].fillna(0)
+        # Calculate customer tenure
+        customer_df['signup_date'] = pd.to_datetime(
+            customer_df['signup_date'], format='%Y-%m-%d', cache=True
+        )
+        today = np.datetime64(datetime.now().date(), 'D')
+        customer_df['tenure_days'] = (
+            today - customer_df['signup_date'].to_numpy(dtype='datetime64[D]')
+        ).astype('int32')
+        
+        # Fill missing customer values
+        numeric_cols = customer_df.select_dtypes(include=[np.number]).columns
+        customer_df[numeric_cols] = customer_df[numeric_cols].fillna(0)
+        
+        # Align usage aggregates to customer rows; customers without usage get zeros
+        usage_agg = (
+            usage_df.set_index('customer_id')
+            .fillna(0)
+            .reindex(customer_df['customer_id'].to_numpy(), fill_value=0)
+        )
+        features_df = pd.concat(
+            [customer_df.reset_index(drop=True), usage_agg.reset_index(drop=True)], axis=1
+        )
         
         # Create derived features
-        features_df['avg_session_per_login'] = (
-            features_df['session_duration_minutes_mean'] / 
-            features_df['login_count_mean'].replace(0, 1)
-        ).round(4)
-        
-        features_df['support_ticket_rate'] = (
-            features_df['support_tickets_sum'] / 
-            features_df['tenure_days'].replace(0, 1) * 30
-        ).round(4)
-        
-        features_df['engagement_score'] = (
-            (features_df['login_count_mean'] * 0.3) +
-            (features_df['session_duration_minutes_mean'] / 60 * 0.4) +
-            (features_df['features_used_mean'] * 0.3)
-        ).round(4)
+        avg_session, ticket_rate, engagement = _derive_usage_features(
+            features_df['login_count_mean'].to_numpy(np.float32),
+            features_df['session_duration_minutes_mean'].to_numpy(np.float32),
+            features_df['features_used_mean'].to_numpy(np.float32),
+            features_df['support_tickets_sum'].to_numpy(np.float32),
+            features_df['tenure_days'].to_numpy(np.float32)
+        )
+        features_df['avg_session_per_login'] = avg_session
+        features_df['support_ticket_rate'] = ticket_rate
+        features_df['engagement_score'] = engagement
+        
+        # Downcast numeric columns to 32-bit
+        float_cols = features_df.select_dtypes(include=['float64']).columns
+        int_cols = features_df.select_dtypes(include=['int64', 'Int64']).columns
+        features_df = features_df.astype({
+            **{col: 'float32' for col in float_cols},
+            **{col: 'int32' for col in int_cols}
+        })
         
         # Encode categorical variables
-        features_df = pd.get_dummies(features_df, columns=[
-            'gender', 'subscription_type', 'contract_length', 'payment_method'
-        ], prefix_sep='_')
+        if fit_encoder or self.encoder is None:
+            self.encoder = OneHotEncoder(
+                sparse_output=False, dtype=np.int8, handle_unknown='ignore'
+            )
+            self.encoder.fit(features_df[CATEGORICAL_COLUMNS])
+        
+        encoded_df = pd.DataFrame(
+            self._encode_categoricals(features_df),
+            columns=self.encoder.get_feature_names_out(),
+            index=features_df.index
+        )
+        features_df = pd.concat(
+            [features_df.drop(columns=CATEGORICAL_COLUMNS), encoded_df], axis=1
+        )
         
         # Convert boolean to int
         bool_cols = features_df.select_dtypes(include=[bool]).columns
-        features_df[bool_cols] = features_df[bool_cols].astype(int)
+        features_df[bool_cols] = features_df[bool_cols].fillna(False).astype('int8')
         
         logger.info(f"Transformed features for {len(features_df)} customers")
         return features_df
     
+    def _encode_categoricals(self, df: pd.DataFrame) -> np.ndarray:
+        """Expand categorical columns into int8 indicators.
+        
+        Uses the fitted encoder's categories, so the output columns match
+        ``encoder.get_feature_names_out()``. Category lookup is a hashed
+        ``pyarrow.compute.index_in`` per column followed by a single scatter;
+        values unseen at fit time produce all-zero rows.
+        """
+        n_rows = len(df)
+        widths = [len(categories) for categories in self.encoder.categories_]
+        encoded = np.zeros((n_rows, sum(widths)), dtype=np.int8)
+        rows = np.arange(n_rows)
+        
+        offset = 0
+        for col, categories, width in zip(CATEGORICAL_COLUMNS, self.encoder.categories_, widths):
+            values = pa.array(df[col], from_pandas=True, type=pa.string())
+            value_set = pa.array(categories, from_pandas=True, type=pa.string())
+            indices = pc.fill_null(pc.index_in(values, value_set=value_set), -1).to_numpy()
+            
+            known = indices >= 0
+            encoded[rows[known], offset + indices[known]] = 1
+            offset += width
+        
+        return encoded
+    
     def load_features(self, features_df: pd.DataFrame) -> None:
         """Load processed features to feature store."""
         logger.info("Loading features to feature store...")
         
         # Prepare feature store data
-        feature_store_data = []
         current_date = datetime.now().date()
         
-        for _, row in features_df.iterrows():
-            feature_record = {
-                'customer_id': row['customer_id'],
-                'feature_date': current_date,
-                'tenure_days': row['tenure_days'],
-                'avg_monthly_usage': row.get('data_usage_gb_mean', 0),
-                'support_ticket_rate': row['support_ticket_rate'],
-                'payment_delay_days': 0,  # Would calculate from payment data
-                'feature_adoption_score': row.get('features_used_mean', 0) / 10,
-                'engagement_score': row['engagement_score'],
-                'churn_risk_score': 0,  # Will be updated by ML model
-                'lifetime_value': row['total_charges']
-            }
-            feature_store_data.append(feature_record)
-        
-        # Insert into feature store
-        feature_store_df = pd.DataFrame(feature_store_data)
+        feature_store_df = pd.DataFrame({
+            'customer_id': features_df['customer_id'],
+            'feature_date': current_date,
+            'tenure_days': features_df['tenure_days'],
+            'avg_monthly_usage': features_df.get('data_usage_gb_mean', 0),
+            'support_ticket_rate': features_df['support_ticket_rate'],
+            'payment_delay_days': 0,  # Would calculate from payment data
+            'feature_adoption_score': features_df.get('features_used_mean', 0) / 10,
+            'engagement_score': features_df['engagement_score'],
+            'churn_risk_score': 0,  # Will be updated by ML model
+            'lifetime_value': features_df['total_charges']
+        })
+        
+        # Customers with several churn events are extracted once per event;
+        # the upsert can't touch the same (customer_id, feature_date) twice
+        feature_store_df = feature_store_df.drop_duplicates('customer_id', keep='last')
+        
+        # Serialize once for COPY, which is far cheaper than INSERTs
+        buffer = io.StringIO()
+        feature_store_df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        columns = ', '.join(feature_store_df.columns)
+        updates = ', '.join(
+            f"{col} = EXCLUDED.{col}" for col in feature_store_df.columns
+            if col not in ('customer_id', 'feature_date')
+        )
         
         with engine.connect() as conn:
-            # Delete existing features for today
             conn.execute(text(
-                "DELETE FROM feature_store WHERE feature_date = :date"
-            ), {"date": current_date})
+                "CREATE TEMP TABLE feature_store_staging "
+                "(LIKE feature_store INCLUDING DEFAULTS) ON COMMIT DROP"
+            ))
             
-            # Insert new features
-            feature_store_df.to_sql(
-                'feature_store', 
-                conn, 
-                if_exists='append', 
-                index=False
-            )
+            # Stage new features
+            with conn.connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY feature_store_staging ({columns}) FROM STDIN WITH (FORMAT CSV)",
+                    buffer
+                )
+            
+            # Upsert into the feature store
+            conn.execute(text(f"""
+                INSERT INTO feature_store ({columns})
+                SELECT {columns} FROM feature_store_staging
+                ON CONFLICT (customer_id, feature_date) DO UPDATE
+                SET {updates}, created_at = CURRENT_TIMESTAMP
+            """))
             conn.commit()
         
-        logger.info(f"Loaded {len(feature_store_data)} feature records")
+        logger.info(f"Loaded {len(feature_store_df)} feature records")
+    
+    def save_encoder(self, filepath: str) -> None:
+        """Save the fitted categorical encoder to disk."""
+        if self.encoder is None:
+            raise ValueError("Encoder must be fitted before saving")
+        
+        joblib.dump(self.encoder, filepath)
+        logger.info(f"Encoder saved to {filepath}")
     
-    def run_etl_pipeline(self) -> pd.DataFrame:
-        """Run complete ETL pipeline."""
+    def load_encoder(self, filepath: str) -> None:
+        """Load a fitted categorical encoder from disk."""
+        self.encoder = joblib.load(filepath)
+        logger.info(f"Encoder loaded from {filepath}")
+    
+    def run_etl_pipeline(self, fit_encoder: bool = False, incremental: bool = False,
+                         since: Optional[datetime] = None) -> pd.DataFrame:
+        """Run complete ETL pipeline.
+        
+        With ``incremental`` set, only customers changed since ``since`` (by
+        default the last feature load) are processed; otherwise every
+        customer is.
+        """
         logger.info("Starting ETL pipeline...")
         
         try:
-            # Extract data
-            customer_df = self.extract_customer_data()
-            usage_df = self.extract_usage_data()
+            # Always work from fresh data
+            self.clear_cache()
             
-            # Transform features
-            features_df = self.transform_features(customer_df, usage_df)
+            customer_ids = self.extract_changed_customer_ids(since) if incremental else None
+            if customer_ids is not None and not customer_ids:
+                logger.info("No customer changes since last run, skipping feature load")
+                features_df = pd.DataFrame()
+            else:
+                # Extract data
+                customer_df = self.extract_customer_data(customer_ids=customer_ids)
+                usage_df = self.extract_usage_data(customer_ids)
+                
+                # Transform features
+                features_df = self.transform_features(customer_df, usage_df, fit_encoder=fit_encoder)
+                
+                # Load to feature store
+                self.load_features(features_df)
             
-            # Load to feature store
-            self.load_features(features_df)
+            # Refresh dashboard aggregates, which also cover tables the
+            # feature load doesn't
+            self.refresh_dashboard_metrics()
             
             logger.info("ETL pipeline completed successfully")
             return features_df
@@ -206,7 +458,7 @@ class ChurnETLPipeline:
 def run_daily_etl():
     """Run daily ETL job."""
     pipeline = ChurnETLPipeline()
-    return pipeline.run_etl_pipeline()
+    return pipeline.run_etl_pipeline(incremental=True)
 
 if __name__ == "__main__":
     run_daily_etl()
@@ -0,0 +1,24 @@
+"""Gunicorn configuration for the churn prediction API."""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = 120
+
+# Import the app (and load models) in the master before forking so
+# workers share the model pages copy-on-write
+preload_app = True
+
+def post_fork(server, worker):
+    """Drop pooled database connections inherited from the master.
+    
+    The master opens one while initializing the database; a socket shared
+    across processes corrupts the protocol. ``close=False`` leaves the
+    master's connection alone.
+    """
+    from config.database import engine
+    engine.dispose(close=False)
@@ -1,5 +1,6 @@
 """ML models package."""
 
-from .churn_predictor import ChurnPredictor, LifetimeValuePredictor
+from .churn_predictor import ChurnPredictor, LifetimeValuePredictor, FeaturePipeline, split_rows, train_all
+from .batching import MicroBatcher
 
-__all__ = ['ChurnPredictor', 'LifetimeValuePredictor']
+__all__ = ['ChurnPredictor', 'LifetimeValuePredictor', 'FeaturePipeline', 'MicroBatcher', 'split_rows', 'train_all']
@@ -0,0 +1,109 @@
+"""Micro-batching of concurrent prediction requests."""
+
+import numpy as np
+import queue
+import threading
+import time
+from typing import Callable, List
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class _PendingRequest:
+    """Feature rows waiting for their slice of a batch prediction."""
+    
+    __slots__ = ('rows', 'event', 'result', 'error')
+    
+    def __init__(self, rows: np.ndarray):
+        self.rows = rows
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """Collate concurrent prediction requests into a single model call.
+    
+    Requests arriving within ``max_wait_ms`` of the first one in a window are
+    stacked into one matrix, predicted together, and the results scattered
+    back to the waiting callers.
+    """
+    
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_wait_ms: float = 5, max_batch_rows: int = 10000,
+                 timeout: float = 30):
+        self.predict_fn = predict_fn
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def submit(self, rows: np.ndarray) -> np.ndarray:
+        """Predict ``rows`` as part of the next batch, blocking until done."""
+        self._ensure_worker()
+        
+        request = _PendingRequest(rows)
+        self._queue.put(request)
+        
+        if not request.event.wait(self.timeout):
+            raise TimeoutError(f"Prediction not completed within {self.timeout}s")
+        
+        if request.error is not None:
+            raise request.error
+        
+        return request.result
+    
+    def _ensure_worker(self) -> None:
+        """Start the batching thread on first use.
+        
+        Started lazily so that each forked gunicorn worker runs its own
+        thread; threads started in a preloading master do not survive fork.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+    
+    def _drain(self) -> List[_PendingRequest]:
+        """Block for one request, then collect more until the window closes."""
+        batch = [self._queue.get()]
+        n_rows = len(batch[0].rows)
+        deadline = time.monotonic() + self.max_wait
+        
+        while n_rows < self.max_batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            n_rows += len(request.rows)
+        
+        return batch
+    
+    def _run(self) -> None:
+        """Batching loop: predict each window and scatter the results."""
+        while True:
+            batch = self._drain()
+            
+            try:
+                predictions = np.asarray(self.predict_fn(np.vstack([r.rows for r in batch])))
+                
+                offset = 0
+                for request in batch:
+                    request.result = predictions[offset:offset + len(request.rows)]
+                    offset += len(request.rows)
+            
+            except Exception as e:
+                logger.error(f"Batch prediction failed: {str(e)}")
+                for request in batch:
+                    request.error = e
+            
+            finally:
+                for request in batch:
+                    request.event.set()
@@ -2,73 +2,380 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.linear_model import LogisticRegression
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import train_test_split, cross_val_score, HalvingRandomSearchCV
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import SGDClassifier
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score
+from sklearn.base import clone
+from sklearn.metrics import roc_auc_score
 import xgboost as xgb
+import dask.dataframe as dd
 import tensorflow as tf
 from tensorflow import keras
 from sklearn.ensemble import RandomForestRegressor
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+import onnxruntime as ort
+import treelite
+import treelite.sklearn
+import treelite_runtime
+from numba import njit, prange, types
 import joblib
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
 import mlflow
 import mlflow.sklearn
 import mlflow.tensorflow
-from typing import Dict, Tuple, Any
+import mlflow.xgboost
+from mlflow.tracking import MlflowClient
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Tuple, Any, Union, Optional, Sequence
+from functools import lru_cache
+import contextlib
+import copy
+import glob
 import logging
+import os
+import tempfile
+import threading
+import uuid
 from datetime import datetime
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Batches smaller than this predict single-threaded; joblib dispatch
+# costs more than the parallel tree traversal saves
+SMALL_BATCH_SIZE = 1000
+
+# Neural network training schedule
+NN_EPOCHS = 50
+NN_BATCH_SIZE = 256
+NN_VALIDATION_SPLIT = 0.2
+
+# Training rows used to calibrate int8 quantization ranges
+NN_CALIBRATION_SAMPLES = 100
+
+# Trees, boosting rounds or epochs added per incremental update
+PARTIAL_TRAIN_ROUNDS = 20
+
+# Histogram GB needs category codes below its 255 bins
+MAX_CATEGORIES = 255
+
+# Target, ID and date columns never used as features
+_EXCLUDE = frozenset({
+    'customer_id', 'customer_code', 'churned', 'churn_date',
+    'churn_reason', 'signup_date'
+})
+
+def _set_predict_n_jobs(model: Any, n_rows: int) -> None:
+    """Pick estimator parallelism for a prediction batch of ``n_rows``."""
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = 1 if n_rows < SMALL_BATCH_SIZE else -1
+
+def _nn_dataset(X: np.ndarray, y: np.ndarray, shuffle: bool = False) -> tf.data.Dataset:
+    """Batched, cached input pipeline for neural network training."""
+    dataset = tf.data.Dataset.from_tensor_slices((X, y)).cache()
+    if shuffle:
+        dataset = dataset.shuffle(len(X), seed=42, reshuffle_each_iteration=True)
+    return dataset.batch(NN_BATCH_SIZE).prefetch(tf.data.AUTOTUNE)
+
+# Inputs are read-only views of any layout so that results handed back
+# read-only (e.g. computed by dask) are scored without a copy
+_SCORE_SIGNATURE = types.UniTuple(types.int64, 4)(
+    types.Array(types.float32, 1, 'A', readonly=True),
+    types.Array(types.int8, 1, 'A', readonly=True)
+)
+
+@njit(_SCORE_SIGNATURE, parallel=True, cache=True)
+def _score(proba, y):
+    """Threshold probabilities at 0.5 and count tp, fp, tn, fn in one pass."""
+    tp = 0
+    fp = 0
+    tn = 0
+    fn = 0
+    
+    for i in prange(proba.shape[0]):
+        if proba[i] > 0.5:
+            if y[i] == 1:
+                tp += 1
+            else:
+                fp += 1
+        else:
+            if y[i] == 1:
+                fn += 1
+            else:
+                tn += 1
+    
+    return tp, fp, tn, fn
+
+# Fast LZ4 compression for saved models; decompressing beats reading the
+# uncompressed tree arrays from disk
+JOBLIB_COMPRESS = ('lz4', 3)
+
+# Uploads model artifacts off the training path, one at a time
+_mlflow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mlflow')
+
+def _log_model_async(run_id: str, flavor: Any, model: Any) -> Future:
+    """Save ``model`` with an MLflow flavor and upload it to ``run_id`` in the background."""
+    def _log():
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = os.path.join(tmpdir, 'model')
+                flavor.save_model(model, path)
+                MlflowClient().log_artifacts(run_id, path, artifact_path='model')
+            logger.info(f"Model artifacts logged to run {run_id}")
+        except Exception as e:
+            logger.error(f"Error logging model to run {run_id}: {str(e)}")
+    
+    return _mlflow_executor.submit(_log)
+
+def _flush_mlflow_uploads() -> None:
+    """Block until queued artifact uploads finish; the executor runs them in order."""
+    _mlflow_executor.submit(lambda: None).result()
+
+@lru_cache(maxsize=4)
+def _load_joblib(filepath: str, mtime: float) -> Any:
+    """Load a joblib artifact, memoized on its path and modification time."""
+    return joblib.load(filepath)
+
+def _require_pipeline(model_data: Dict[str, Any], filepath: str) -> None:
+    """Reject artifacts saved before models shared a ``FeaturePipeline``."""
+    if 'pipeline' not in model_data:
+        raise ValueError(f"{filepath} was saved before the shared feature pipeline; retrain required")
+
+def _remove_stale_native_libs(filepath: str, keep: Optional[str]) -> None:
+    """Delete libraries compiled for earlier saves of ``filepath``, except ``keep``.
+    
+    Processes that still have one mapped keep it until they reload.
+    """
+    stem = glob.escape(os.path.splitext(filepath)[0])
+    for libpath in glob.glob(stem + '.so') + glob.glob(stem + '-*.so'):
+        if libpath != keep:
+            os.remove(libpath)
+
+def _category_codes(values: pd.Series, categories: list) -> np.ndarray:
+    """Float codes of ``values`` within ``categories``; missing or unseen are NaN."""
+    codes = pd.Categorical(values, categories=categories).codes.astype(np.float32)
+    codes[codes < 0] = np.nan
+    return codes
+
+def _float_matrix(df: pd.DataFrame, columns: list) -> np.ndarray:
+    """Writable float32 array of ``columns``; nullable columns' NA become NaN."""
+    X = df[columns].to_numpy(np.float32, na_value=np.nan)
+    if not X.flags.writeable:
+        # Copy-on-write frames may hand out read-only views
+        X = X.copy()
+    return X
+
+def _fill_nan(arr: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Fill NaNs in a float feature matrix with per-column ``values``, in place."""
+    rows, cols = np.nonzero(np.isnan(arr))
+    arr[rows, cols] = np.take(values, cols)
+    return arr
+
+def split_rows(df: pd.DataFrame, test_size: float = 0.2) -> Tuple[np.ndarray, np.ndarray]:
+    """Train and test row positions of a feature frame.
+    
+    Deterministic and stratified on ``churned`` when present, so the churn
+    and CLV models split a frame the same way.
+    """
+    stratify = df['churned'] if 'churned' in df.columns else None
+    return train_test_split(np.arange(len(df)), test_size=test_size, random_state=42, stratify=stratify)
+
+class FeaturePipeline:
+    """Numeric feature selection, median imputation and standardization.
+    
+    Fit once on the training rows given by ``split_rows`` and pass the same
+    instance to each predictor's ``train``; every model takes the subset of
+    ``feature_columns`` it uses.
+    """
+    
+    def __init__(self, feature_columns: Optional[list] = None):
+        self.feature_columns = feature_columns
+        self.medians = None
+        self.scaler = None
+        self._index = None if feature_columns is None else pd.Index(feature_columns)
+    
+    @staticmethod
+    def numeric_columns(df: Union[pd.DataFrame, dd.DataFrame]) -> list:
+        """Numeric model input columns of a feature frame."""
+        return df.select_dtypes(include=[np.number, bool]).columns.difference(_EXCLUDE, sort=False).tolist()
+    
+    def fit(self, df: pd.DataFrame) -> 'FeaturePipeline':
+        """Learn the feature columns, their medians and scaling from ``df``."""
+        self.feature_columns = self.numeric_columns(df)
+        self._index = pd.Index(self.feature_columns)
+        
+        # Nullable columns' NA become NaN in the one float32 array that is
+        # imputed and scaled; columns with no observed values fall back to 0
+        X = _float_matrix(df, self.feature_columns)
+        self.medians = np.nan_to_num(np.nanmedian(X, axis=0)).astype(np.float32)
+        self.scaler = StandardScaler(copy=False).fit(_fill_nan(X, self.medians))
+        
+        logger.info(f"Feature pipeline fitted on {len(self.feature_columns)} columns")
+        return self
+    
+    def transform(self, df: pd.DataFrame, columns: Optional[list] = None, scale: bool = False) -> np.ndarray:
+        """Imputed float32 matrix of ``columns``, standardized in place if ``scale``.
+        
+        Without fitted medians (e.g. for XGBoost trained on dask frames)
+        missing values are left as NaN.
+        """
+        # Subsets are located through the index's cached hash table
+        if columns is None:
+            columns, idx = self.feature_columns, slice(None)
+        else:
+            idx = self._index.get_indexer(columns)
+        
+        X = _float_matrix(df, columns)
+        
+        if self.medians is not None:
+            _fill_nan(X, self.medians[idx])
+        
+        if scale:
+            np.subtract(X, self.scaler.mean_[idx], out=X)
+            np.divide(X, self.scaler.scale_[idx], out=X)
+        
+        return X
+
 class ChurnPredictor:
     """Customer churn prediction model."""
     
+    # Model types that can be exported to ONNX for inference
+    ONNX_MODEL_TYPES = ('random_forest', 'logistic_regression', 'gradient_boosting')
+    
+    # Model types that can be compiled to a native library with Treelite
+    NATIVE_MODEL_TYPES = ('random_forest', 'xgboost')
+    
+    # Model types that split on categorical features natively
+    CATEGORICAL_MODEL_TYPES = ('xgboost', 'gradient_boosting')
+    
+    # Hyperparameter search spaces for ``tune``
+    PARAM_DISTRIBUTIONS = {
+        'random_forest': {
+            'n_estimators': [100, 200, 400],
+            'max_depth': [6, 10, 16, None],
+            'min_samples_leaf': [1, 2, 4, 8],
+            'max_features': ['sqrt', 0.5, 1.0]
+        },
+        'xgboost': {
+            'max_depth': [4, 6, 8],
+            'learning_rate': [0.03, 0.1, 0.3],
+            'subsample': [0.6, 0.8, 1.0],
+            'colsample_bytree': [0.6, 0.8, 1.0]
+        },
+        'logistic_regression': {
+            'alpha': [1e-5, 1e-4, 1e-3, 1e-2],
+            'penalty': ['l2', 'l1', 'elasticnet']
+        },
+        'gradient_boosting': {
+            'learning_rate': [0.03, 0.1, 0.3],
+            'max_depth': [3, 6, None],
+            'max_leaf_nodes': [15, 31, 63],
+            'l2_regularization': [0.0, 0.1, 1.0]
+        }
+    }
+    
+    # Model types trained on standardized features
+    SCALED_MODEL_TYPES = ('logistic_regression', 'neural_network')
+    
+    # Cores available for training, split between CV folds and estimator threads
+    n_jobs = os.cpu_count() or 1
+    
     def __init__(self, model_type: str = 'random_forest'):
         self.model_type = model_type
         self.model = None
-        self.scaler = StandardScaler()
+        self.pipeline = FeaturePipeline()
         self.feature_columns = None
+        self.categories = {}
+        self.model_params = {}
         self.is_trained = False
+        # Database time at which the newest training data was extracted;
+        # incremental updates select changes since then
+        self.data_watermark = None
+        self.onnx_session = None
+        self.native_predictor = None
+        self.tflite_model = None
+        self.tflite_interpreter = None
+        # Scaled training rows, kept to recalibrate quantization after updates
+        self.nn_calibration = None
+        self._tflite_lock = threading.Lock()
         
         # MLflow setup
         mlflow.set_experiment("customer_churn_prediction")
     
+    def __getstate__(self) -> Dict[str, Any]:
+        """Pickle state without the inference sessions and lock.
+        
+        The quantized TFLite model is reloaded from its bytes on unpickling;
+        ONNX and native libraries must be loaded again explicitly.
+        """
+        state = self.__dict__.copy()
+        state.update(onnx_session=None, native_predictor=None, tflite_interpreter=None, _tflite_lock=None)
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._tflite_lock = threading.Lock()
+        if self.tflite_model is not None:
+            self.load_tflite(self.tflite_model)
+    
     def prepare_features(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
-        """Prepare features for training."""
+        """Prepare features for training with the fitted ``pipeline``."""
         logger.info("Preparing features for training...")
         
-        # Define feature columns (exclude target and ID columns)
-        exclude_cols = [
-            'customer_id', 'customer_code', 'churned', 'churn_date', 
-            'churn_reason', 'signup_date'
-        ]
-        
-        feature_cols = [col for col in df.columns if col not in exclude_cols]
+        categorical_cols = self._categorical_columns(df)
+        self.categories = {col: list(df[col].astype('category').cat.categories) for col in categorical_cols}
+        self.feature_columns = self.pipeline.feature_columns + categorical_cols
         
-        # Handle missing values
-        X = df[feature_cols].copy()
-        X = X.fillna(X.median() if X.select_dtypes(include=[np.number]).shape[1] > 0 else 0)
+        X = pd.DataFrame(self._matrix(df), columns=self.feature_columns, index=df.index)
         
         # Target variable
         y = df['churned'] if 'churned' in df.columns else None
         
-        self.feature_columns = feature_cols
-        logger.info(f"Prepared {len(feature_cols)} features")
+        logger.info(f"Prepared {len(self.feature_columns)} features")
         
         return X, y
     
+    def _matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Float32 model inputs: pipeline features, then category codes."""
+        X = self.pipeline.transform(df, scale=self.model_type in self.SCALED_MODEL_TYPES)
+        
+        # Categoricals are appended as codes; missing values stay missing
+        if self.categories:
+            codes = [_category_codes(df[col], categories) for col, categories in self.categories.items()]
+            X = np.column_stack([X] + codes)
+        
+        return X
+    
+    def _categorical_columns(self, df: pd.DataFrame) -> list:
+        """String columns to feed as native categoricals, if the model can."""
+        if self.model_type not in self.CATEGORICAL_MODEL_TYPES:
+            return []
+        
+        string_cols = df.select_dtypes(include=['object', 'category']).columns.difference(_EXCLUDE, sort=False)
+        return [col for col in string_cols if df[col].nunique() <= MAX_CATEGORIES]
+    
     def create_model(self) -> Any:
-        """Create model based on model_type."""
+        """Create model based on model_type, with any tuned parameters applied."""
+        model = self._create_base_model()
+        if self.model_params:
+            model.set_params(**self.model_params)
+        return model
+    
+    def _create_base_model(self) -> Any:
+        """Create model based on model_type with default parameters."""
         if self.model_type == 'random_forest':
             return RandomForestClassifier(
                 n_estimators=100,
                 max_depth=10,
                 min_samples_split=5,
                 min_samples_leaf=2,
-                random_state=42
+                random_state=42,
+                n_jobs=self.n_jobs
             )
         elif self.model_type == 'xgboost':
             return xgb.XGBClassifier(
@@ -77,18 +384,26 @@ class ChurnPredictor:
                 learning_rate=0.1,
                 subsample=0.8,
                 colsample_bytree=0.8,
-                random_state=42
+                tree_method='hist',
+                max_bin=256,
+                grow_policy='lossguide',
+                random_state=42,
+                n_jobs=self.n_jobs
             )
         elif self.model_type == 'logistic_regression':
-            return LogisticRegression(
+            # Logistic loss fit by SGD so the model can be updated incrementally
+            return SGDClassifier(
+                loss='log_loss',
                 random_state=42,
                 max_iter=1000
             )
         elif self.model_type == 'gradient_boosting':
-            return GradientBoostingClassifier(
-                n_estimators=100,
+            return HistGradientBoostingClassifier(
+                max_iter=100,
                 learning_rate=0.1,
                 max_depth=6,
+                early_stopping=True,
+                categorical_features=self._categorical_mask(),
                 random_state=42
             )
         elif self.model_type == 'neural_network':
@@ -96,221 +411,751 @@ class ChurnPredictor:
         else:
             raise ValueError(f"Unsupported model type: {self.model_type}")
     
+    def tune(self, df: pd.DataFrame, n_candidates: Any = 'exhaust') -> Dict[str, Any]:
+        """Search hyperparameters by successive halving over training rows.
+        
+        The best parameters are kept in ``model_params`` and used by later
+        calls to ``train``.
+        """
+        if self.model_type not in self.PARAM_DISTRIBUTIONS:
+            raise ValueError(f"Tuning not supported for model type: {self.model_type}")
+        
+        logger.info(f"Tuning {self.model_type} hyperparameters...")
+        
+        # Features are prepared on a copy so a trained model keeps its own
+        tuner = copy.copy(self)
+        tuner.pipeline = FeaturePipeline().fit(df)
+        X, y = tuner.prepare_features(df)
+        if y is None:
+            raise ValueError("Target variable 'churned' not found in dataset")
+        
+        X = X.to_numpy(np.float32)
+        
+        # Start from defaults; candidates fit in parallel, one thread each
+        tuner.model_params = {}
+        estimator = tuner.create_model()
+        if self.model_type == 'xgboost':
+            estimator.set_params(**tuner._xgboost_matrix_args())
+        if 'n_jobs' in estimator.get_params():
+            estimator.set_params(n_jobs=1)
+        
+        search = HalvingRandomSearchCV(
+            estimator,
+            self.PARAM_DISTRIBUTIONS[self.model_type],
+            n_candidates=n_candidates,
+            factor=3,
+            resource='n_samples',
+            scoring='roc_auc',
+            cv=5,
+            random_state=42,
+            n_jobs=self.n_jobs
+        )
+        search.fit(X, y)
+        
+        self.model_params = search.best_params_
+        logger.info(f"Best parameters: {search.best_params_}, AUC: {search.best_score_:.4f}")
+        
+        return {
+            'best_params': search.best_params_,
+            'best_score': search.best_score_,
+            'n_iterations': search.n_iterations_
+        }
+    
+    def _categorical_mask(self) -> Any:
+        """Boolean mask of categorical feature columns, or None if there are none."""
+        if not self.categories:
+            return None
+        return [col in self.categories for col in self.feature_columns]
+    
     def _create_neural_network(self) -> keras.Model:
         """Create neural network model."""
-        model = keras.Sequential([
-            keras.layers.Dense(128, activation='relu', input_shape=(len(self.feature_columns),)),
-            keras.layers.Dropout(0.3),
-            keras.layers.Dense(64, activation='relu'),
-            keras.layers.Dropout(0.3),
-            keras.layers.Dense(32, activation='relu'),
-            keras.layers.Dropout(0.2),
-            keras.layers.Dense(1, activation='sigmoid')
-        ])
-        
-        model.compile(
-            optimizer='adam',
-            loss='binary_crossentropy',
-            metrics=['accuracy', 'precision', 'recall']
-        )
+        # Mirror variables across GPUs when present
+        if tf.config.list_physical_devices('GPU'):
+            strategy = tf.distribute.MirroredStrategy()
+        else:
+            strategy = tf.distribute.get_strategy()
+        
+        with strategy.scope():
+            model = keras.Sequential([
+                keras.layers.Dense(128, activation='relu', input_shape=(len(self.feature_columns),)),
+                keras.layers.Dropout(0.3),
+                keras.layers.Dense(64, activation='relu'),
+                keras.layers.Dropout(0.3),
+                keras.layers.Dense(32, activation='relu'),
+                keras.layers.Dropout(0.2),
+                keras.layers.Dense(1, activation='sigmoid')
+            ])
+            
+            # XLA-compile the train step into fused kernels
+            model.compile(
+                optimizer='adam',
+                loss='binary_crossentropy',
+                metrics=['accuracy', 'precision', 'recall'],
+                jit_compile=True
+            )
         
         return model
     
-    def train(self, df: pd.DataFrame, test_size: float = 0.2) -> Dict[str, Any]:
-        """Train the churn prediction model."""
+    def train(self, df: Union[pd.DataFrame, dd.DataFrame], test_size: float = 0.2,
+              pipeline: Optional[FeaturePipeline] = None) -> Dict[str, Any]:
+        """Train the churn prediction model.
+        
+        ``df`` may be a dask DataFrame; XGBoost then trains out of core.
+        A ``pipeline`` already fitted on the training rows of
+        ``split_rows(df, test_size)`` is reused instead of refit.
+        """
         logger.info(f"Training {self.model_type} model...")
         
-        with mlflow.start_run(run_name=f"churn_{self.model_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"):
-            # Prepare features
-            X, y = self.prepare_features(df)
-            
-            if y is None:
-                raise ValueError("Target variable 'churned' not found in dataset")
-            
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=test_size, random_state=42, stratify=y
-            )
-            
-            # Scale features for certain models
-            if self.model_type in ['logistic_regression', 'neural_network']:
-                X_train_scaled = self.scaler.fit_transform(X_train)
-                X_test_scaled = self.scaler.transform(X_test)
-            else:
-                X_train_scaled = X_train
-                X_test_scaled = X_test
-            
-            # Create and train model
-            self.model = self.create_model()
-            
-            if self.model_type == 'neural_network':
-                # Train neural network
-                history = self.model.fit(
-                    X_train_scaled, y_train,
-                    epochs=50,
-                    batch_size=32,
-                    validation_split=0.2,
-                    verbose=0
-                )
-                
-                # Log neural network metrics
-                mlflow.log_param("epochs", 50)
-                mlflow.log_param("batch_size", 32)
-                
-            else:
-                # Train sklearn models
-                self.model.fit(X_train_scaled, y_train)
-            
-            # Make predictions
-            if self.model_type == 'neural_network':
-                y_pred_proba = self.model.predict(X_test_scaled).flatten()
-                y_pred = (y_pred_proba > 0.5).astype(int)
+        # Any exported ONNX graph or native library belongs to the previous model
+        self.onnx_session = None
+        self.native_predictor = None
+        self.tflite_model = self.tflite_interpreter = self.nn_calibration = None
+        
+        with mlflow.start_run(run_name=f"churn_{self.model_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}") as run:
+            if isinstance(df, dd.DataFrame) and self.model_type == 'xgboost':
+                # Train across partitions without materializing the frame
+                y_test, y_pred_proba, cv_mean, cv_std, n_samples = self._fit_dask(df, test_size)
             else:
-                y_pred = self.model.predict(X_test_scaled)
-                y_pred_proba = self.model.predict_proba(X_test_scaled)[:, 1]
+                if isinstance(df, dd.DataFrame):
+                    # Other estimators need the data in memory
+                    df = df.compute()
+                y_test, y_pred_proba, cv_mean, cv_std, n_samples = self._fit(df, test_size, pipeline)
             
-            # Calculate metrics
-            accuracy = np.mean(y_pred == y_test)
+            # Calculate metrics; the confusion counts come from one pass
+            # over the probabilities, thresholded as sklearn's predict would
+            y_pred_proba = np.asarray(y_pred_proba, dtype=np.float32)
+            tp, fp, tn, fn = _score(y_pred_proba, y_test.to_numpy(np.int8))
+            accuracy = (tp + tn) / len(y_test)
+            precision = tp / (tp + fp) if tp + fp else 0.0
+            recall = tp / (tp + fn) if tp + fn else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
             auc_score = roc_auc_score(y_test, y_pred_proba)
             
-            # Cross-validation for sklearn models
-            if self.model_type != 'neural_network':
-                cv_scores = cross_val_score(self.model, X_train_scaled, y_train, cv=5)
-                cv_mean = cv_scores.mean()
-                cv_std = cv_scores.std()
-            else:
-                cv_mean = cv_std = 0
-            
             # Log parameters and metrics
-            mlflow.log_param("model_type", self.model_type)
-            mlflow.log_param("test_size", test_size)
-            mlflow.log_param("n_features", len(self.feature_columns))
-            mlflow.log_param("n_samples", len(X))
-            
-            mlflow.log_metric("accuracy", accuracy)
-            mlflow.log_metric("auc_score", auc_score)
-            mlflow.log_metric("cv_mean", cv_mean)
-            mlflow.log_metric("cv_std", cv_std)
-            
-            # Log model
-            if self.model_type == 'neural_network':
-                mlflow.tensorflow.log_model(self.model, "model")
-            else:
-                mlflow.sklearn.log_model(self.model, "model")
+            metrics = {
+                'accuracy': accuracy,
+                'auc_score': auc_score,
+                'precision': precision,
+                'recall': recall,
+                'f1_score': f1,
+                'cv_mean': cv_mean,
+                'cv_std': cv_std
+            }
             
             # Feature importance for tree-based models
             feature_importance = None
-            if hasattr(self.model, 'feature_importances_'):
+            if self.model_type == 'xgboost':
+                feature_importance = self._xgboost_importance()
+            elif hasattr(self.model, 'feature_importances_'):
                 feature_importance = dict(zip(self.feature_columns, self.model.feature_importances_))
+            
+            if feature_importance is not None:
                 # Log top 10 features
                 top_features = sorted(feature_importance.items(), key=lambda x: x[1], reverse=True)[:10]
                 for i, (feature, importance) in enumerate(top_features):
-                    mlflow.log_metric(f"feature_importance_{i+1}_{feature}", importance)
+                    metrics[f"feature_importance_{i+1}_{feature}"] = importance
+            
+            # One tracking request each for params and metrics
+            mlflow.log_params({
+                'model_type': self.model_type,
+                'test_size': test_size,
+                'n_features': len(self.feature_columns),
+                'n_samples': n_samples
+            })
+            mlflow.log_metrics(metrics)
+            
+            # Log model; the artifact upload can take seconds, so it runs
+            # in the background against this run's ID
+            if self.model_type == 'neural_network':
+                flavor = mlflow.tensorflow
+            elif self.model_type == 'xgboost':
+                flavor = mlflow.xgboost
+            else:
+                flavor = mlflow.sklearn
+            _log_model_async(run.info.run_id, flavor, self.model)
             
             self.is_trained = True
             
             results = {
                 'accuracy': accuracy,
                 'auc_score': auc_score,
+                'precision': precision,
+                'recall': recall,
+                'f1_score': f1,
                 'cv_mean': cv_mean,
                 'cv_std': cv_std,
                 'feature_importance': feature_importance,
-                'classification_report': classification_report(y_test, y_pred),
-                'confusion_matrix': confusion_matrix(y_test, y_pred).tolist()
+                'confusion_matrix': [[tn, fp], [fn, tp]]
             }
             
             logger.info(f"Model training completed. Accuracy: {accuracy:.4f}, AUC: {auc_score:.4f}")
             return results
     
+    def _fit(self, df: pd.DataFrame, test_size: float,
+             pipeline: Optional[FeaturePipeline]) -> Tuple[pd.Series, np.ndarray, float, float, int]:
+        """Fit the model in memory.
+        
+        Returns the test labels and probabilities, CV accuracy mean and std,
+        and the number of samples.
+        """
+        if 'churned' not in df.columns:
+            raise ValueError("Target variable 'churned' not found in dataset")
+        
+        # Split data first; imputation, scaling and categories are learned
+        # from the training rows only
+        train_rows, test_rows = split_rows(df, test_size)
+        train_df = df.iloc[train_rows]
+        test_df = df.iloc[test_rows]
+        
+        self.pipeline = pipeline if pipeline is not None else FeaturePipeline().fit(train_df)
+        X_train, y_train = self.prepare_features(train_df)
+        X_test = self._matrix(test_df)
+        y_test = test_df['churned']
+        
+        # Work on contiguous float32 arrays from here on, already scaled
+        # by the pipeline where the model needs it. Tree builders scan one
+        # feature across all samples, so they get column-major arrays;
+        # linear and neural models consume whole rows
+        order = 'C' if self.model_type in self.SCALED_MODEL_TYPES else 'F'
+        X_train = np.asarray(X_train.to_numpy(np.float32), order=order)
+        X_test = np.asarray(X_test, order=order)
+        
+        # Create and train model
+        if self.model_type == 'xgboost':
+            # Native API: one quantized matrix, no wrapper re-conversion
+            self.model, cv_mean, cv_std = self._train_xgboost(X_train, y_train)
+        
+        elif self.model_type == 'neural_network':
+            # Train neural network; hold out the tail for validation
+            # as validation_split does
+            self.model = self.create_model()
+            y_train_nn = y_train.to_numpy(np.float32)
+            n_fit = len(X_train) - int(len(X_train) * NN_VALIDATION_SPLIT)
+            
+            history = self.model.fit(
+                _nn_dataset(X_train[:n_fit], y_train_nn[:n_fit], shuffle=True),
+                validation_data=_nn_dataset(X_train[n_fit:], y_train_nn[n_fit:]),
+                epochs=NN_EPOCHS,
+                verbose=0
+            )
+            
+            # Log neural network metrics
+            mlflow.log_params({'epochs': NN_EPOCHS, 'batch_size': NN_BATCH_SIZE})
+            
+            # Serve from an int8-quantized copy
+            self.nn_calibration = X_train[:NN_CALIBRATION_SAMPLES].copy()
+            self.quantize_neural_network(self.nn_calibration)
+            
+        else:
+            # Train sklearn models
+            self.model = self.create_model()
+            self.model.fit(X_train, y_train)
+        
+        # Predict the test set once; labels are thresholded when scoring
+        if self.model_type == 'neural_network':
+            y_pred_proba = self.model.predict(X_test).flatten()
+        elif self.model_type == 'xgboost':
+            y_pred_proba = self.model.inplace_predict(X_test)
+        else:
+            y_pred_proba = self.model.predict_proba(X_test)[:, 1]
+        
+        # Cross-validation for sklearn models; xgb.cv ran during training
+        if self.model_type not in ['xgboost', 'neural_network']:
+            cv_scores = self._cross_validate(X_train, y_train, cv=5)
+            cv_mean = cv_scores.mean()
+            cv_std = cv_scores.std()
+        elif self.model_type == 'neural_network':
+            cv_mean = cv_std = 0
+        
+        return y_test, y_pred_proba, cv_mean, cv_std, len(df)
+    
+    def _fit_dask(self, df: dd.DataFrame, test_size: float) -> Tuple[pd.Series, np.ndarray, float, float, int]:
+        """Fit XGBoost over dask partitions, returning the same as ``_fit``.
+        
+        Runs on the active dask client, or on a local cluster started and
+        shut down for this fit. Missing values are left to XGBoost's native
+        handling and CV is skipped.
+        """
+        # Only this path needs the distributed scheduler
+        from dask.distributed import Client, get_client
+        from xgboost import dask as dxgb
+        
+        if 'churned' not in df.columns:
+            raise ValueError("Target variable 'churned' not found in dataset")
+        
+        self.pipeline = FeaturePipeline(FeaturePipeline.numeric_columns(df))
+        self.feature_columns = self.pipeline.feature_columns
+        self.categories = {}
+        train_df, test_df = df.random_split([1 - test_size, test_size], random_state=42)
+        
+        params, num_boost_round = self._xgboost_params()
+        # Dask workers bring their own thread counts
+        params.pop('n_jobs', None)
+        
+        try:
+            cluster = contextlib.nullcontext(get_client())
+        except ValueError:
+            cluster = Client()
+        
+        with cluster as client:
+            dtrain = dxgb.DaskQuantileDMatrix(
+                client,
+                train_df[self.feature_columns].astype(np.float32),
+                train_df['churned'],
+                max_bin=params['max_bin']
+            )
+            output = dxgb.train(client, params, dtrain, num_boost_round=num_boost_round)
+            self.model = output['booster']
+            # Serve from positional arrays like boosters trained in memory
+            self.model.feature_names = None
+            
+            X_test = test_df[self.feature_columns].astype(np.float32)
+            y_pred_proba = np.asarray(dxgb.inplace_predict(client, self.model, X_test).compute())
+            y_test = test_df['churned'].compute()
+        
+        return y_test, y_pred_proba, 0, 0, len(df)
+    
+    def _cross_validate(self, X: np.ndarray, y: pd.Series, cv: int) -> np.ndarray:
+        """Score folds in parallel without oversubscribing cores.
+        
+        Folds run in separate processes; each fold's estimator gets an equal
+        share of the remaining cores so processes x threads ~= n_jobs.
+        """
+        outer_jobs = max(1, min(cv, self.n_jobs))
+        inner_jobs = max(1, self.n_jobs // outer_jobs)
+        
+        estimator = clone(self.model)
+        if 'n_jobs' in estimator.get_params():
+            estimator.set_params(n_jobs=inner_jobs)
+        
+        return cross_val_score(estimator, X, y, cv=cv, n_jobs=outer_jobs)
+    
+    def _train_xgboost(self, X_train: np.ndarray, y_train: pd.Series) -> Tuple[xgb.Booster, float, float]:
+        """Train a native XGBoost booster and cross-validate it.
+        
+        Returns the booster with the mean and std of 5-fold CV accuracy.
+        """
+        params, num_boost_round = self._xgboost_params()
+        
+        # CV folds are sliced from a plain DMatrix; QuantileDMatrix can't be sliced
+        cv_results = xgb.cv(
+            params,
+            xgb.DMatrix(X_train, label=y_train, **self._xgboost_matrix_args()),
+            num_boost_round=num_boost_round,
+            nfold=5,
+            stratified=True,
+            metrics='error',
+            seed=42
+        )
+        cv_mean = 1 - cv_results['test-error-mean'].iloc[-1]
+        cv_std = cv_results['test-error-std'].iloc[-1]
+        
+        dtrain = xgb.QuantileDMatrix(X_train, label=y_train, max_bin=params['max_bin'], **self._xgboost_matrix_args())
+        booster = xgb.train(params, dtrain, num_boost_round=num_boost_round)
+        
+        return booster, cv_mean, cv_std
+    
+    def _xgboost_params(self) -> Tuple[Dict[str, Any], int]:
+        """Native booster parameters and round count from ``create_model``."""
+        clf = self.create_model()
+        params = {k: v for k, v in clf.get_xgb_params().items() if v is not None}
+        return params, clf.n_estimators
+    
+    def _xgboost_matrix_args(self) -> Dict[str, Any]:
+        """DMatrix arguments marking the categorical feature columns."""
+        if not self.categories:
+            return {}
+        return {
+            'feature_types': ['c' if col in self.categories else 'q' for col in self.feature_columns],
+            'enable_categorical': True
+        }
+    
+    def _xgboost_importance(self) -> Dict[str, float]:
+        """Normalized gain importance per feature for the native booster."""
+        gain = self.model.get_score(importance_type='gain')
+        importances = np.array([gain.get(f'f{i}', 0.0) for i in range(len(self.feature_columns))])
+        
+        total = importances.sum()
+        if total > 0:
+            importances /= total
+        
+        return dict(zip(self.feature_columns, importances))
+    
+    def partial_train(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Update the trained model with new rows instead of refitting.
+        
+        Feature columns and scaling stay fixed from the last full ``train``.
+        The update is fitted on a copy that replaces the model on success,
+        so the estimator held by the artifact cache is never modified.
+        """
+        if not self.is_trained:
+            raise ValueError("Model must be trained before it can be updated")
+        
+        if 'churned' not in df.columns:
+            raise ValueError("Target variable 'churned' not found in dataset")
+        
+        logger.info(f"Updating {self.model_type} model with {len(df)} new samples...")
+        
+        X_new = self.feature_matrix(df)
+        y_new = df['churned'].to_numpy()
+        
+        # Warm-started trees fitted on fewer classes than the model knows
+        # would reset ``classes_`` and break predict_proba
+        if self.model_type in ('random_forest', 'gradient_boosting'):
+            batch_classes = np.unique(y_new)
+            if not np.array_equal(batch_classes, self.model.classes_):
+                logger.warning(
+                    f"Skipping {self.model_type} update: batch has classes {batch_classes.tolist()}, "
+                    f"model has {self.model.classes_.tolist()}"
+                )
+                return {
+                    'model_type': self.model_type,
+                    'n_samples': len(df),
+                    'updated': False,
+                    'reason': 'Update batch does not contain every class; run a full train'
+                }
+        
+        if self.model_type == 'logistic_regression':
+            model = copy.deepcopy(self.model)
+            model.partial_fit(X_new, y_new, classes=[0, 1])
+        
+        elif self.model_type == 'random_forest':
+            # Existing trees are kept; only the added trees see the new rows
+            model = copy.deepcopy(self.model)
+            model.set_params(warm_start=True, n_estimators=model.n_estimators + PARTIAL_TRAIN_ROUNDS)
+            model.fit(X_new, y_new)
+        
+        elif self.model_type == 'gradient_boosting':
+            # Update batches are too small to hold out a validation split
+            model = copy.deepcopy(self.model)
+            model.set_params(warm_start=True, early_stopping=False, max_iter=model.n_iter_ + PARTIAL_TRAIN_ROUNDS)
+            model.fit(X_new, y_new)
+        
+        elif self.model_type == 'xgboost':
+            # Training continues on a copy of the given booster
+            params, _ = self._xgboost_params()
+            dnew = xgb.QuantileDMatrix(X_new, label=y_new, max_bin=params['max_bin'], **self._xgboost_matrix_args())
+            model = xgb.train(params, dnew, num_boost_round=PARTIAL_TRAIN_ROUNDS, xgb_model=self.model)
+        
+        elif self.model_type == 'neural_network':
+            model = self._create_neural_network()
+            model.set_weights(self.model.get_weights())
+            model.fit(_nn_dataset(X_new, y_new.astype(np.float32), shuffle=True),
+                      epochs=PARTIAL_TRAIN_ROUNDS, verbose=0)
+        
+        self.model = model
+        
+        # Any exported ONNX graph or native library belongs to the previous model
+        self.onnx_session = None
+        self.native_predictor = None
+        if self.model_type == 'neural_network' and self.tflite_model is not None:
+            # The update batch alone may be too small or skewed to calibrate on
+            self.quantize_neural_network(self.nn_calibration if self.nn_calibration is not None else X_new)
+        
+        logger.info("Model update completed")
+        return {
+            'model_type': self.model_type,
+            'n_samples': len(df),
+            'updated': True
+        }
+    
     def predict(self, X: pd.DataFrame) -> np.ndarray:
         """Predict churn probability."""
+        return self.predict_matrix(self.feature_matrix(X))
+    
+    def feature_matrix(self, X: pd.DataFrame) -> np.ndarray:
+        """Build the model input matrix from a feature frame."""
         if not self.is_trained:
             raise ValueError("Model must be trained before making predictions")
         
-        # Ensure features match training data
-        X_features = X[self.feature_columns].fillna(0)
-        
-        # Scale if necessary
-        if self.model_type in ['logistic_regression', 'neural_network']:
-            X_features = self.scaler.transform(X_features)
+        # Impute and scale as in training
+        return self._matrix(X)
+    
+    def predict_matrix(self, X_features: np.ndarray) -> np.ndarray:
+        """Predict churn probability from a matrix built by ``feature_matrix``."""
+        if not self.is_trained:
+            raise ValueError("Model must be trained before making predictions")
         
-        if self.model_type == 'neural_network':
+        if self.native_predictor is not None:
+            predictions = self.native_predictor.predict(treelite_runtime.DMatrix(X_features))
+            # Forest classifiers compile to per-class outputs
+            if predictions.ndim == 2:
+                predictions = predictions[:, 1]
+        elif self.onnx_session is not None:
+            predictions = self.onnx_session.run(['probabilities'], {'X': X_features})[0][:, 1]
+        elif self.tflite_interpreter is not None:
+            predictions = self._predict_tflite(X_features)
+        elif self.model_type == 'neural_network':
             predictions = self.model.predict(X_features).flatten()
+        elif self.model_type == 'xgboost':
+            predictions = self.model.inplace_predict(X_features)
         else:
+            if hasattr(self.model, 'feature_names_in_'):
+                X_features = pd.DataFrame(X_features, columns=self.feature_columns)
+            _set_predict_n_jobs(self.model, len(X_features))
             predictions = self.model.predict_proba(X_features)[:, 1]
         
         return predictions
     
-    def save_model(self, filepath: str) -> None:
-        """Save trained model to disk."""
+    def save_model(self, filepath: str, export_native: bool = False) -> None:
+        """Save trained model to disk.
+        
+        With ``export_native``, supported tree models are also compiled to a
+        shared library next to ``filepath`` and served from it.
+        """
         if not self.is_trained:
             raise ValueError("Model must be trained before saving")
         
         model_data = {
             'model': self.model,
-            'scaler': self.scaler,
+            'pipeline': self.pipeline,
             'feature_columns': self.feature_columns,
-            'model_type': self.model_type
+            'categories': self.categories,
+            'model_params': self.model_params,
+            'model_type': self.model_type,
+            'data_watermark': self.data_watermark
         }
         
-        joblib.dump(model_data, filepath)
+        native_lib = None
+        if export_native and self.model_type in self.NATIVE_MODEL_TYPES and not self.categories:
+            # A fresh path per export; other processes may have the previous
+            # library mapped, and rewriting a mapped file can crash them
+            native_lib = f"{os.path.splitext(filepath)[0]}-{uuid.uuid4().hex}.so"
+            try:
+                self.export_native(native_lib)
+                model_data['native_lib'] = native_lib
+            except Exception as e:
+                # The artifact is still usable without the compiled library
+                logger.error(f"Native export failed, saving without it: {e}")
+                self.native_predictor = None
+                native_lib = None
+        
+        if self.tflite_model is not None:
+            model_data['tflite_model'] = self.tflite_model
+            model_data['nn_calibration'] = self.nn_calibration
+        
+        joblib.dump(model_data, filepath, compress=JOBLIB_COMPRESS, protocol=5)
+        _remove_stale_native_libs(filepath, keep=native_lib)
         logger.info(f"Model saved to {filepath}")
     
     def load_model(self, filepath: str) -> None:
         """Load trained model from disk."""
-        model_data = joblib.load(filepath)
+        model_data = _load_joblib(filepath, os.path.getmtime(filepath))
+        _require_pipeline(model_data, filepath)
         
         self.model = model_data['model']
-        self.scaler = model_data['scaler']
+        self.pipeline = model_data['pipeline']
         self.feature_columns = model_data['feature_columns']
+        self.categories = model_data.get('categories', {})
+        self.model_params = model_data.get('model_params', {})
         self.model_type = model_data['model_type']
+        self.data_watermark = model_data.get('data_watermark')
+        
         self.is_trained = True
+        self.onnx_session = None
+        self.native_predictor = None
+        
+        native_lib = model_data.get('native_lib')
+        if native_lib and os.path.exists(native_lib):
+            self.load_native(native_lib)
+        
+        self.tflite_model = self.tflite_interpreter = None
+        self.nn_calibration = model_data.get('nn_calibration')
+        if model_data.get('tflite_model') is not None:
+            self.load_tflite(model_data['tflite_model'])
         
         logger.info(f"Model loaded from {filepath}")
+    
+    def export_onnx(self, filepath: str) -> None:
+        """Export the trained model to ONNX and serve predictions from it."""
+        if not self.is_trained:
+            raise ValueError("Model must be trained before exporting")
+        
+        if self.model_type not in self.ONNX_MODEL_TYPES:
+            raise ValueError(f"ONNX export not supported for model type: {self.model_type}")
+        
+        if self.categories:
+            raise ValueError("ONNX export not supported for models with categorical features")
+        
+        initial_types = [('X', FloatTensorType([None, len(self.feature_columns)]))]
+        onnx_model = convert_sklearn(
+            self.model,
+            initial_types=initial_types,
+            options={id(self.model): {'zipmap': False}}
+        )
+        
+        with open(filepath, 'wb') as f:
+            f.write(onnx_model.SerializeToString())
+        
+        logger.info(f"ONNX model exported to {filepath}")
+        self.load_onnx(filepath)
+    
+    def load_onnx(self, filepath: str) -> None:
+        """Load an exported ONNX model for inference."""
+        # Single-threaded ops avoid thread dispatch overhead on small batches
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = 1
+        
+        self.onnx_session = ort.InferenceSession(
+            filepath, sess_options, providers=['CPUExecutionProvider']
+        )
+        logger.info(f"ONNX model loaded from {filepath}")
+    
+    def export_native(self, libpath: str) -> None:
+        """Compile the trained tree ensemble to a shared library with Treelite."""
+        if not self.is_trained:
+            raise ValueError("Model must be trained before exporting")
+        
+        if self.categories:
+            raise ValueError("Native export not supported for models with categorical features")
+        
+        if self.model_type == 'xgboost':
+            native_model = treelite.Model.from_xgboost_json(self.model.save_raw(raw_format='json').decode())
+        elif self.model_type == 'random_forest':
+            native_model = treelite.sklearn.import_model(self.model)
+        else:
+            raise ValueError(f"Native export not supported for model type: {self.model_type}")
+        
+        native_model.export_lib(
+            toolchain='gcc',
+            libpath=libpath,
+            params={'parallel_comp': os.cpu_count() or 1}
+        )
+        
+        logger.info(f"Native model compiled to {libpath}")
+        self.load_native(libpath)
+    
+    def load_native(self, libpath: str) -> None:
+        """Load a Treelite-compiled model library for inference."""
+        # Single-threaded like the ONNX session; requests are small batches
+        self.native_predictor = treelite_runtime.Predictor(libpath, nthread=1)
+        logger.info(f"Native model loaded from {libpath}")
+    
+    def quantize_neural_network(self, X_calibration: np.ndarray) -> None:
+        """Convert the Keras model to int8 TFLite and serve predictions from it.
+        
+        ``X_calibration`` holds scaled rows used to calibrate activation ranges.
+        """
+        if self.model_type != 'neural_network':
+            raise ValueError(f"Quantization not supported for model type: {self.model_type}")
+        
+        def representative_dataset():
+            for row in X_calibration[:NN_CALIBRATION_SAMPLES]:
+                yield [np.asarray(row[None, :], dtype=np.float32)]
+        
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        
+        self.load_tflite(converter.convert())
+        logger.info("Neural network quantized to int8 TFLite")
+    
+    def load_tflite(self, tflite_model: bytes) -> None:
+        """Load a quantized TFLite model for inference."""
+        self.tflite_model = tflite_model
+        self.tflite_interpreter = tf.lite.Interpreter(model_content=tflite_model, num_threads=1)
+        self.tflite_interpreter.allocate_tensors()
+    
+    def _predict_tflite(self, X_features: np.ndarray) -> np.ndarray:
+        """Run the quantized model; float inputs are quantized inside the graph."""
+        X_features = np.ascontiguousarray(X_features, dtype=np.float32)
+        
+        # The interpreter holds per-call tensor state
+        with self._tflite_lock:
+            interpreter = self.tflite_interpreter
+            input_details = interpreter.get_input_details()[0]
+            output_details = interpreter.get_output_details()[0]
+            
+            if tuple(input_details['shape']) != X_features.shape:
+                interpreter.resize_tensor_input(input_details['index'], X_features.shape)
+                interpreter.allocate_tensors()
+            
+            interpreter.set_tensor(input_details['index'], X_features)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_details['index']).flatten()
+
+def _train_one(model_type: str, df: pd.DataFrame, pipeline: FeaturePipeline,
+               n_jobs: int) -> Tuple[ChurnPredictor, Dict[str, Any]]:
+    """Train one churn model in a worker process, within ``n_jobs`` threads."""
+    predictor = ChurnPredictor(model_type)
+    predictor.n_jobs = n_jobs
+    
+    # Also caps OpenMP and BLAS pools, e.g. histogram gradient boosting's
+    with threadpool_limits(limits=n_jobs):
+        results = predictor.train(df, pipeline=pipeline)
+    
+    # Idle workers may be shut down; don't lose the artifact upload
+    _flush_mlflow_uploads()
+    return predictor, results
+
+def train_all(df: pd.DataFrame, model_types: Sequence[str]) -> Dict[str, Tuple[ChurnPredictor, Dict[str, Any]]]:
+    """Train a churn model of each type concurrently, one process per model.
+    
+    Imputation and scaling are fitted once, on the training rows shared by
+    every model, with the default test split. Cores are split
+    between the processes so that processes x estimator threads ~= cores.
+    Returns each trained predictor with its training results.
+    """
+    train_rows, _ = split_rows(df)
+    pipeline = FeaturePipeline().fit(df.iloc[train_rows])
+    
+    n_workers = max(1, min(len(model_types), ChurnPredictor.n_jobs))
+    n_jobs = max(1, ChurnPredictor.n_jobs // n_workers)
+    
+    logger.info(f"Training {len(model_types)} models across {n_workers} processes...")
+    trained = Parallel(n_jobs=n_workers, backend='loky')(
+        delayed(_train_one)(model_type, df, pipeline, n_jobs) for model_type in model_types
+    )
+    
+    return dict(zip(model_types, trained))
 
 class LifetimeValuePredictor:
     """Customer lifetime value prediction model."""
     
     def __init__(self):
         self.model = None
-        self.scaler = StandardScaler()
+        self.pipeline = FeaturePipeline()
         self.feature_columns = None
         self.is_trained = False
     
     def prepare_features(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
-        """Prepare features for CLV prediction."""
-        exclude_cols = [
-            'customer_id', 'customer_code', 'churned', 'churn_date',
-            'churn_reason', 'signup_date', 'total_charges'
-        ]
-        
-        feature_cols = [col for col in df.columns if col not in exclude_cols]
-        X = df[feature_cols].fillna(0)
+        """Prepare scaled features for CLV prediction with the fitted ``pipeline``."""
+        # The target is a churn feature but not a CLV one
+        feature_cols = [col for col in self.pipeline.feature_columns if col != 'total_charges']
+        X = self.pipeline.transform(df, feature_cols, scale=True)
+        X = pd.DataFrame(X, columns=feature_cols, index=df.index)
         y = df['total_charges'] if 'total_charges' in df.columns else None
         
         self.feature_columns = feature_cols
         return X, y
     
-    def train(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Train CLV prediction model."""
-        logger.info("Training CLV prediction model...")
+    def train(self, df: pd.DataFrame, pipeline: Optional[FeaturePipeline] = None) -> Dict[str, Any]:
+        """Train CLV prediction model.
         
-        X, y = self.prepare_features(df)
+        A ``pipeline`` already fitted on the training rows of
+        ``split_rows(df)`` is reused instead of refit.
+        """
+        logger.info("Training CLV prediction model...")
         
-        if y is None:
+        if 'total_charges' not in df.columns:
             raise ValueError("Target variable 'total_charges' not found")
         
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+        # Split data first; imputation and scaling are learned from the
+        # training rows only
+        train_rows, test_rows = split_rows(df)
+        self.pipeline = pipeline if pipeline is not None else FeaturePipeline().fit(df.iloc[train_rows])
+        X, y = self.prepare_features(df)
+        X = X.to_numpy(np.float32)
         
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
+        # Column-major float32 arrays for the tree builder
+        X_train_scaled = np.asfortranarray(X[train_rows])
+        X_test_scaled = np.asfortranarray(X[test_rows])
+        y_train = y.iloc[train_rows]
+        y_test = y.iloc[test_rows]
         
         # Train model
-        self.model = RandomForestRegressor(n_estimators=100, random_state=42)
+        self.model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
         self.model.fit(X_train_scaled, y_train)
         
         # Evaluate
@@ -326,10 +1171,45 @@ class LifetimeValuePredictor:
     
     def predict(self, X: pd.DataFrame) -> np.ndarray:
         """Predict customer lifetime value."""
+        return self.predict_matrix(self.feature_matrix(X))
+    
+    def feature_matrix(self, X: pd.DataFrame) -> np.ndarray:
+        """Build the scaled model input matrix from a feature frame."""
         if not self.is_trained:
             raise ValueError("Model must be trained before making predictions")
         
-        X_features = X[self.feature_columns].fillna(0)
-        X_scaled = self.scaler.transform(X_features)
+        return self.pipeline.transform(X, self.feature_columns, scale=True)
+    
+    def predict_matrix(self, X_scaled: np.ndarray) -> np.ndarray:
+        """Predict customer lifetime value from a matrix built by ``feature_matrix``."""
+        if not self.is_trained:
+            raise ValueError("Model must be trained before making predictions")
         
+        _set_predict_n_jobs(self.model, len(X_scaled))
         return self.model.predict(X_scaled)
+    
+    def save_model(self, filepath: str) -> None:
+        """Save trained model to disk."""
+        if not self.is_trained:
+            raise ValueError("Model must be trained before saving")
+        
+        model_data = {
+            'model': self.model,
+            'pipeline': self.pipeline,
+            'feature_columns': self.feature_columns
+        }
+        
+        joblib.dump(model_data, filepath, compress=JOBLIB_COMPRESS, protocol=5)
+        logger.info(f"Model saved to {filepath}")
+    
+    def load_model(self, filepath: str) -> None:
+        """Load trained model from disk."""
+        model_data = _load_joblib(filepath, os.path.getmtime(filepath))
+        _require_pipeline(model_data, filepath)
+        
+        self.model = model_data['model']
+        self.pipeline = model_data['pipeline']
+        self.feature_columns = model_data['feature_columns']
+        self.is_trained = True
+        
+        logger.info(f"Model loaded from {filepath}")
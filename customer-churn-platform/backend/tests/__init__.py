@@ -0,0 +1 @@
+"""Backend tests."""
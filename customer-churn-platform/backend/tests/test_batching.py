@@ -0,0 +1,131 @@
+"""Tests for micro-batching of concurrent prediction requests."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from models.batching import MicroBatcher
+
+def _submit_concurrently(batcher: MicroBatcher, requests: list) -> list:
+    """Submit each row block from its own thread, released together."""
+    barrier = threading.Barrier(len(requests))
+    
+    def submit(rows):
+        barrier.wait()
+        return batcher.submit(rows)
+    
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        futures = [pool.submit(submit, rows) for rows in requests]
+        return [future.exception() or future.result() for future in futures]
+
+def test_results_scattered_to_their_submitters():
+    """Each caller gets its own rows' predictions, in order, however batched."""
+    calls = []
+    
+    def predict(X):
+        calls.append(len(X))
+        return X[:, 0] * 2
+    
+    batcher = MicroBatcher(predict, max_wait_ms=50)
+    requests = [
+        np.arange(i * 100, i * 100 + n, dtype=np.float32).reshape(-1, 1)
+        for i, n in enumerate([1, 5, 2, 7, 3, 1, 4, 6])
+    ]
+    
+    results = _submit_concurrently(batcher, requests)
+    
+    for rows, result in zip(requests, results):
+        assert result.shape == (len(rows),)
+        np.testing.assert_array_equal(result, rows[:, 0] * 2)
+    assert sum(calls) == sum(len(rows) for rows in requests)
+    assert len(calls) < len(requests)
+
+def test_max_batch_rows_closes_window():
+    """A window stops collecting once it holds ``max_batch_rows`` rows."""
+    calls = []
+    
+    def predict(X):
+        calls.append(len(X))
+        return X[:, 0]
+    
+    batcher = MicroBatcher(predict, max_wait_ms=200, max_batch_rows=4)
+    requests = [np.full((3, 1), i, dtype=np.float32) for i in range(4)]
+    
+    results = _submit_concurrently(batcher, requests)
+    
+    for rows, result in zip(requests, results):
+        np.testing.assert_array_equal(result, rows[:, 0])
+    assert max(calls) <= 6
+
+def test_error_propagates_to_every_waiter():
+    """A failed batch prediction raises in every caller waiting on it."""
+    def predict(X):
+        raise ValueError("model exploded")
+    
+    batcher = MicroBatcher(predict, max_wait_ms=50)
+    requests = [np.ones((n, 2), dtype=np.float32) for n in (1, 3, 2)]
+    
+    results = _submit_concurrently(batcher, requests)
+    
+    for result in results:
+        assert isinstance(result, ValueError)
+        assert str(result) == "model exploded"
+
+def test_worker_survives_failed_batch():
+    """Batches after a failure are still predicted."""
+    fail = threading.Event()
+    fail.set()
+    
+    def predict(X):
+        if fail.is_set():
+            fail.clear()
+            raise RuntimeError("transient")
+        return X.sum(axis=1)
+    
+    batcher = MicroBatcher(predict, max_wait_ms=1)
+    
+    with pytest.raises(RuntimeError):
+        batcher.submit(np.ones((2, 2)))
+    np.testing.assert_array_equal(batcher.submit(np.ones((2, 2))), [2, 2])
+
+def test_submit_times_out():
+    """A caller gives up with TimeoutError when the prediction is too slow."""
+    release = threading.Event()
+    
+    def predict(X):
+        release.wait(5)
+        return X[:, 0]
+    
+    batcher = MicroBatcher(predict, max_wait_ms=1, timeout=0.05)
+    
+    try:
+        with pytest.raises(TimeoutError):
+            batcher.submit(np.ones((1, 1)))
+    finally:
+        release.set()
+
+def test_empty_and_non_empty_requests_in_one_batch():
+    """Empty requests get empty results without shifting their neighbours' slices."""
+    batcher = MicroBatcher(lambda X: X[:, 0] + 1, max_wait_ms=50)
+    requests = [
+        np.empty((0, 2), dtype=np.float32),
+        np.array([[1, 0], [2, 0]], dtype=np.float32),
+        np.empty((0, 2), dtype=np.float32),
+        np.array([[3, 0]], dtype=np.float32)
+    ]
+    
+    results = _submit_concurrently(batcher, requests)
+    
+    assert [len(result) for result in results] == [0, 2, 0, 1]
+    np.testing.assert_array_equal(results[1], [2, 3])
+    np.testing.assert_array_equal(results[3], [4])
+
+def test_only_empty_request():
+    """A batch of nothing but an empty request still completes."""
+    batcher = MicroBatcher(lambda X: X[:, 0], max_wait_ms=1)
+    
+    result = batcher.submit(np.empty((0, 3), dtype=np.float32))
+    
+    assert result.shape == (0,)
@@ -0,0 +1,113 @@
+"""Tests for the churn prediction model."""
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import confusion_matrix
+
+from models.churn_predictor import ChurnPredictor, _score
+
+@pytest.fixture(autouse=True)
+def mlflow_tracking(tmp_path, monkeypatch):
+    """Keep MLflow runs out of the working directory."""
+    monkeypatch.setenv('MLFLOW_TRACKING_URI', (tmp_path / 'mlruns').as_uri())
+
+@pytest.fixture
+def features_df() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 300
+    return pd.DataFrame({
+        'customer_id': np.arange(1, n + 1),
+        'age': rng.integers(18, 70, n).astype(np.float32),
+        'monthly_charges': rng.uniform(20, 150, n).astype(np.float32),
+        'total_charges': rng.uniform(100, 2000, n).astype(np.float32),
+        'tenure_days': rng.integers(1, 1000, n).astype(np.int32),
+        'churned': rng.integers(0, 2, n).astype(np.int32)
+    })
+
+def test_score_matches_confusion_matrix():
+    """Counts agree with sklearn's confusion matrix at the 0.5 threshold."""
+    rng = np.random.default_rng(42)
+    proba = rng.random(10000, dtype=np.float32)
+    y = rng.integers(0, 2, 10000).astype(np.int8)
+    
+    tp, fp, tn, fn = _score(proba, y)
+    
+    (expected_tn, expected_fp), (expected_fn, expected_tp) = confusion_matrix(y, proba > 0.5)
+    assert (tp, fp, tn, fn) == (expected_tp, expected_fp, expected_tn, expected_fn)
+
+def test_score_threshold_is_exclusive():
+    """A probability of exactly 0.5 is a negative prediction, as in predict."""
+    proba = np.array([0.5, 0.5, 0.51, 0.49], dtype=np.float32)
+    y = np.array([1, 0, 1, 0], dtype=np.int8)
+    
+    assert _score(proba, y) == (1, 0, 2, 1)
+
+def test_score_read_only_strided_inputs():
+    """Read-only, non-contiguous views are scored without a copy."""
+    proba = np.array([0.9, 0.0, 0.1, 0.0, 0.8, 0.0], dtype=np.float32)[::2]
+    y = np.array([1, 0, 1], dtype=np.int8)
+    proba.flags.writeable = False
+    y.flags.writeable = False
+    
+    assert _score(proba, y) == (2, 0, 1, 0)
+
+def test_score_empty():
+    """No predictions give all-zero counts."""
+    assert _score(np.empty(0, np.float32), np.empty(0, np.int8)) == (0, 0, 0, 0)
+
+def test_partial_train_small_batch_gradient_boosting(features_df):
+    """A handful of update rows is too few for early stopping's validation split."""
+    model = ChurnPredictor('gradient_boosting')
+    model.train(features_df)
+    batch = features_df.head(6).assign(churned=[0, 1, 0, 1, 0, 0])
+    
+    result = model.partial_train(batch)
+    
+    assert result['updated']
+    assert model.predict(features_df.head(3)).shape == (3,)
+
+def test_partial_train_single_class_batch_skipped(features_df):
+    """Warm-started trees aren't fitted on a batch missing a class."""
+    model = ChurnPredictor('random_forest')
+    model.train(features_df)
+    trained = model.model
+    
+    result = model.partial_train(features_df.head(20).assign(churned=0))
+    
+    assert not result['updated']
+    assert model.model is trained
+    assert model.predict(features_df.head(3)).shape == (3,)
+
+def test_save_model_survives_native_export_failure(features_df, tmp_path, monkeypatch):
+    """A failed compile leaves a loadable artifact with no native predictor."""
+    model = ChurnPredictor('random_forest')
+    model.train(features_df)
+    
+    def fail(libpath):
+        raise RuntimeError('toolchain not found')
+    monkeypatch.setattr(model, 'export_native', fail)
+    path = str(tmp_path / 'churn_model.joblib')
+    model.save_model(path, export_native=True)
+    
+    assert model.native_predictor is None
+    assert not list(tmp_path.glob('*.so'))
+    loaded = ChurnPredictor()
+    loaded.load_model(path)
+    assert loaded.native_predictor is None
+    np.testing.assert_array_equal(loaded.predict(features_df.head(5)), model.predict(features_df.head(5)))
+
+def test_load_model_rejects_artifact_without_pipeline(features_df, tmp_path):
+    """Artifacts from before the shared feature pipeline ask for a retrain."""
+    model = ChurnPredictor('random_forest')
+    model.train(features_df)
+    path = str(tmp_path / 'churn_model.joblib')
+    model.save_model(path)
+    model_data = joblib.load(path)
+    del model_data['pipeline']
+    legacy_path = str(tmp_path / 'legacy_model.joblib')
+    joblib.dump(model_data, legacy_path)
+    
+    with pytest.raises(ValueError, match='retrain required'):
+        ChurnPredictor().load_model(legacy_path)
@@ -0,0 +1,62 @@
+"""Tests for the ETL feature transformations."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import OneHotEncoder
+
+from data_pipeline.etl import ChurnETLPipeline, CATEGORICAL_COLUMNS
+
+@pytest.fixture
+def fitted_pipeline() -> ChurnETLPipeline:
+    pipeline = ChurnETLPipeline()
+    pipeline.encoder = OneHotEncoder(sparse_output=False, dtype=np.int8, handle_unknown='ignore')
+    pipeline.encoder.fit(pd.DataFrame({
+        'gender': ['M', 'F', 'F'],
+        'subscription_type': ['Basic', 'Premium', 'Enterprise'],
+        'contract_length': ['Monthly', 'Annual', 'Quarterly'],
+        'payment_method': ['Credit Card', 'PayPal', 'Bank Transfer']
+    }))
+    return pipeline
+
+def test_encode_categoricals_matches_encoder(fitted_pipeline):
+    """Indicators match the fitted encoder's own transform, column for column."""
+    df = pd.DataFrame({
+        'gender': ['F', 'M', 'F', 'M'],
+        'subscription_type': ['Premium', 'Basic', 'Enterprise', 'Premium'],
+        'contract_length': ['Annual', 'Annual', 'Monthly', 'Quarterly'],
+        'payment_method': ['PayPal', 'Credit Card', 'Bank Transfer', 'PayPal']
+    })
+    
+    encoded = fitted_pipeline._encode_categoricals(df)
+    
+    assert encoded.dtype == np.int8
+    assert encoded.shape == (4, len(fitted_pipeline.encoder.get_feature_names_out()))
+    np.testing.assert_array_equal(encoded, fitted_pipeline.encoder.transform(df[CATEGORICAL_COLUMNS]))
+
+def test_encode_categoricals_unseen_and_missing(fitted_pipeline):
+    """Unseen and missing values give all-zero indicators for their column only."""
+    df = pd.DataFrame({
+        'gender': ['X', None],
+        'subscription_type': ['Basic', None],
+        'contract_length': ['Monthly', 'Biennial'],
+        'payment_method': ['PayPal', 'PayPal']
+    })
+    
+    encoded = pd.DataFrame(
+        fitted_pipeline._encode_categoricals(df),
+        columns=fitted_pipeline.encoder.get_feature_names_out()
+    )
+    
+    assert encoded.filter(like='gender_').to_numpy().sum() == 0
+    assert encoded.filter(like='subscription_type_').sum(axis=1).tolist() == [1, 0]
+    assert encoded.filter(like='contract_length_').sum(axis=1).tolist() == [1, 0]
+    assert encoded['payment_method_PayPal'].tolist() == [1, 1]
+
+def test_encode_categoricals_empty_frame(fitted_pipeline):
+    """An empty frame encodes to an empty matrix with every indicator column."""
+    df = pd.DataFrame({col: pd.Series([], dtype=object) for col in CATEGORICAL_COLUMNS})
+    
+    encoded = fitted_pipeline._encode_categoricals(df)
+    
+    assert encoded.shape == (0, len(fitted_pipeline.encoder.get_feature_names_out()))
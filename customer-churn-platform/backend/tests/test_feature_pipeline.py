@@ -0,0 +1,106 @@
+"""Tests for the feature pipeline shared by the churn and CLV models."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.churn_predictor import FeaturePipeline, split_rows
+
+@pytest.fixture
+def features_df() -> pd.DataFrame:
+    return pd.DataFrame({
+        'customer_id': [1, 2, 3, 4, 5, 6],
+        'customer_code': ['C1', 'C2', 'C3', 'C4', 'C5', 'C6'],
+        'churned': [0, 1, 0, 1, 0, 1],
+        'age': [20.0, np.nan, 40.0, 50.0, np.nan, 30.0],
+        'monthly_charges': pd.array([10, 20, None, 40, 50, 60], dtype='Int32'),
+        'total_charges': [100.0, 200.0, 300.0, 400.0, 500.0, 600.0],
+        'paperless_billing': [True, False, True, True, False, False],
+        'location': ['NY', 'CA', 'TX', 'NY', 'CA', 'TX'],
+        'empty': [np.nan] * 6
+    })
+
+def test_fit_selects_numeric_feature_columns(features_df):
+    """IDs, targets and string columns are excluded, column order is kept."""
+    pipeline = FeaturePipeline().fit(features_df)
+    
+    assert pipeline.feature_columns == [
+        'age', 'monthly_charges', 'total_charges', 'paperless_billing', 'empty'
+    ]
+
+def test_fit_learns_nan_medians(features_df):
+    """Medians ignore missing values; all-missing columns fall back to 0."""
+    pipeline = FeaturePipeline().fit(features_df)
+    
+    np.testing.assert_allclose(pipeline.medians, [35, 40, 350, 0.5, 0])
+
+def test_transform_fills_with_fitted_medians(features_df):
+    """Missing values at transform time take the medians learned in ``fit``."""
+    pipeline = FeaturePipeline().fit(features_df)
+    new_df = features_df.assign(age=[np.nan] * 6)
+    
+    X = pipeline.transform(new_df)
+    
+    assert X.dtype == np.float32
+    assert not np.isnan(X).any()
+    np.testing.assert_array_equal(X[:, 0], 35)
+
+def test_transform_scales_to_training_statistics(features_df):
+    """Scaled training features have zero mean and unit variance."""
+    pipeline = FeaturePipeline().fit(features_df)
+    
+    X = pipeline.transform(features_df, scale=True)
+    
+    np.testing.assert_allclose(X[:, :4].mean(axis=0), 0, atol=1e-6)
+    np.testing.assert_allclose(X[:, :4].std(axis=0), 1, atol=1e-6)
+    # Constant columns are centred, not divided by zero
+    np.testing.assert_array_equal(X[:, 4], 0)
+
+def test_transform_column_subset_matches_full(features_df):
+    """A subset of columns is imputed and scaled exactly as in the full matrix."""
+    pipeline = FeaturePipeline().fit(features_df)
+    
+    full = pipeline.transform(features_df, scale=True)
+    subset = pipeline.transform(features_df, ['total_charges', 'age'], scale=True)
+    
+    np.testing.assert_array_equal(subset, full[:, [2, 0]])
+
+def test_transform_does_not_modify_input(features_df):
+    """In-place imputation and scaling work on a copy of the frame's data."""
+    original = features_df.copy()
+    pipeline = FeaturePipeline().fit(features_df)
+    
+    pipeline.transform(features_df, scale=True)
+    
+    pd.testing.assert_frame_equal(features_df, original)
+
+def test_unfitted_statistics_leave_missing_values():
+    """A column-only pipeline, as used for dask-trained XGBoost, keeps NaNs."""
+    pipeline = FeaturePipeline(['a', 'b'])
+    df = pd.DataFrame({'a': [1.0, np.nan], 'b': [np.nan, 2.0]})
+    
+    X = pipeline.transform(df)
+    
+    np.testing.assert_array_equal(np.isnan(X), [[False, True], [True, False]])
+
+def test_split_rows_is_deterministic_and_stratified():
+    """Repeated splits agree and keep the churn rate in both parts."""
+    df = pd.DataFrame({'churned': [0] * 80 + [1] * 20})
+    
+    train_rows, test_rows = split_rows(df, test_size=0.2)
+    train_again, test_again = split_rows(df, test_size=0.2)
+    
+    np.testing.assert_array_equal(train_rows, train_again)
+    np.testing.assert_array_equal(test_rows, test_again)
+    assert len(test_rows) == 20
+    assert sorted(np.concatenate([train_rows, test_rows])) == list(range(100))
+    assert df['churned'].iloc[test_rows].sum() == 4
+
+def test_split_rows_without_target():
+    """Frames without ``churned`` are split unstratified."""
+    df = pd.DataFrame({'total_charges': np.arange(10.0)})
+    
+    train_rows, test_rows = split_rows(df, test_size=0.3)
+    
+    assert len(train_rows) == 7
+    assert len(test_rows) == 3
@@ -18,6 +18,19 @@ CREATE TABLE IF NOT EXISTS customers (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Keep customers.updated_at current on every update
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS customers_set_updated_at ON customers;
+CREATE TRIGGER customers_set_updated_at
+BEFORE UPDATE ON customers
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
 -- Create usage metrics table
 CREATE TABLE IF NOT EXISTS usage_metrics (
     metric_id SERIAL PRIMARY KEY,
@@ -60,8 +73,10 @@ CREATE TABLE IF NOT EXISTS feature_store (
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_customers_signup_date ON customers(signup_date);
 CREATE INDEX IF NOT EXISTS idx_usage_metrics_customer_date ON usage_metrics(customer_id, metric_date);
+CREATE INDEX IF NOT EXISTS idx_usage_metrics_created_at ON usage_metrics(created_at);
 CREATE INDEX IF NOT EXISTS idx_churn_events_customer ON churn_events(customer_id);
-CREATE INDEX IF NOT EXISTS idx_feature_store_customer_date ON feature_store(customer_id, feature_date);
+CREATE INDEX IF NOT EXISTS idx_churn_events_created_at ON churn_events(created_at);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_feature_store_customer_date ON feature_store(customer_id, feature_date);
 
 -- Insert sample data
 INSERT INTO customers (customer_code, signup_date, age, gender, location, subscription_type, monthly_charges, total_charges, contract_length, payment_method, paperless_billing) VALUES
@@ -84,3 +99,16 @@ INSERT INTO usage_metrics (customer_id, metric_date, login_count, session_durati
 INSERT INTO churn_events (customer_id, churn_date, churn_reason, is_voluntary) VALUES
 (2, '2024-01-15', 'Price too high', true),
 (4, '2024-01-20', 'Poor customer service', true);
+
+-- Create dashboard aggregates (refreshed by the ETL pipeline)
+CREATE MATERIALIZED VIEW IF NOT EXISTS dashboard_metrics AS
+SELECT
+    c.subscription_type,
+    GROUPING(c.subscription_type) AS is_total,
+    COUNT(*) AS customer_count,
+    SUM(CASE WHEN ch.customer_id IS NOT NULL THEN 1 ELSE 0 END) AS churned_count,
+    SUM(c.total_charges) AS total_revenue,
+    AVG(c.total_charges) AS avg_revenue
+FROM customers c
+LEFT JOIN churn_events ch ON c.customer_id = ch.customer_id
+GROUP BY GROUPING SETS ((), (c.subscription_type));
@@ -47,6 +47,7 @@ export const apiService = {
   
   // Model management
   trainModels: () => api.post('/api/train'),
+  updateModels: () => api.post('/api/train/incremental'),
   
   // ETL operations
   runETL: () => api.post('/api/etl/run'),